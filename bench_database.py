@@ -0,0 +1,138 @@
+"""数据库查询延迟基准
+
+生成包含大量预测记录的测试数据库，分别在默认连接参数、无二级索引（旧版本）和
+Database 的 WAL + 索引 + 统计表配置下测量常用查询的延迟。示例：
+    python bench_database.py --rows 1000000 --users 2000
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+
+from database import Database
+
+BREEDS = ("Chihuahua", "Maltese_dog", "Pekinese", "Shih-Tzu", "papillon", "toy_terrier", "beagle", "pug")
+
+
+def build_dataset(path, rows, users, seed=0):
+    """按旧版本结构（无二级索引、回滚日志）生成测试数据库"""
+    db = Database(path)
+    db.prediction_writer.close()
+    # 去掉迁移建立的索引、触发器和统计表，回到迁移前的结构
+    objects = db.conn.execute(
+        "SELECT type, name FROM sqlite_master WHERE type IN ('index', 'trigger') AND name NOT LIKE 'sqlite_%'").fetchall()
+    for object_type, name in objects:
+        db.conn.execute(f"DROP {object_type.upper()} IF EXISTS {name}")
+    db.conn.execute("DROP TABLE IF EXISTS stats")
+    db.conn.execute("DROP TABLE IF EXISTS sqlite_stat1")
+    db.conn.execute("PRAGMA user_version = 0")
+    db.conn.execute("PRAGMA journal_mode = DELETE")
+    db.conn.commit()
+
+    rng = random.Random(seed)
+    user_ids = [str(1001 + i) for i in range(users)]
+    start = time.mktime((2024, 1, 1, 0, 0, 0, 0, 0, -1))
+
+    def predictions():
+        for i in range(rows):
+            timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(start + i * 30 + rng.randrange(30)))
+            yield (str(uuid.UUID(int=rng.getrandbits(128))), rng.choice(user_ids), f"images/{i}.jpg",
+                   rng.choice(BREEDS), timestamp)
+
+    with db.conn:
+        db.conn.executemany("INSERT INTO prediction VALUES (?, ?, ?, ?, ?)", predictions())
+        db.conn.executemany("INSERT INTO serve VALUES (?, ?, ?, datetime('now'), ?)",
+                            ((str(uuid.uuid4()), rng.choice(user_ids), "反馈", rng.random() < 0.5)
+                             for _ in range(rows // 100)))
+        db.conn.executemany("INSERT INTO notice VALUES (?, ?, datetime('now', ?))",
+                            ((f"公告 {i}", "1001", f"-{i} minutes") for i in range(1000)))
+    db.conn.close()
+    return user_ids
+
+
+QUERIES = (
+    ("用户最近 50 条预测", "SELECT * FROM prediction WHERE USERID = ? ORDER BY PREDICTTIME DESC LIMIT 50", True),
+    ("用户预测次数", "SELECT COUNT(*) FROM prediction WHERE USERID = ?", True),
+    ("用户反馈列表", "SELECT * FROM serve WHERE USERID = ?", True),
+    ("最新公告", "SELECT NOTICE FROM notice ORDER BY TIME DESC LIMIT 1", False),
+)
+
+# 主页统计：旧版本逐表 COUNT(*)，迁移后读取触发器维护的 stats 表
+HOME_STATS_LEGACY = ("SELECT (SELECT COUNT(*) FROM user) + (SELECT COUNT(*) FROM admin), (SELECT COUNT(*) FROM serve), "
+                     "(SELECT COUNT(*) FROM prediction), (SELECT NOTICE FROM notice ORDER BY TIME DESC LIMIT 1)")
+HOME_STATS = ("SELECT USER_COUNT + ADMIN_COUNT, FEEDBACK_COUNT, PREDICTION_COUNT, LATEST_NOTICE FROM stats "
+              "WHERE ID = 1")
+
+
+def measure(conn, user_ids, repeat, home_stats_sql, seed=1):
+    """返回每个查询的平均延迟（毫秒）以及单条插入并提交的平均延迟"""
+    rng = random.Random(seed)
+    timings = {}
+    for label, sql, per_user in QUERIES + (("主页统计", home_stats_sql, False),):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(sql, (rng.choice(user_ids),) if per_user else ()).fetchall()
+        timings[label] = (time.perf_counter() - start) * 1000 / repeat
+
+    start = time.perf_counter()
+    for i in range(repeat):
+        conn.execute("INSERT INTO prediction VALUES (?, ?, ?, ?, datetime('now'))",
+                     (str(uuid.uuid4()), rng.choice(user_ids), f"bench/{i}.jpg", BREEDS[0]))
+        conn.commit()
+    timings["插入一条预测并提交"] = (time.perf_counter() - start) * 1000 / repeat
+    return timings
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="数据库查询延迟基准")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="预测记录数")
+    parser.add_argument("--users", type=int, default=2000, help="用户数")
+    parser.add_argument("--repeat", type=int, default=200, help="每个查询的重复次数")
+    parser.add_argument("--dir", help="测试数据库所在目录，默认使用临时目录并在结束后删除")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    work_dir = args.dir or tempfile.mkdtemp(prefix="bench_db_")
+    os.makedirs(work_dir, exist_ok=True)
+    baseline_path = os.path.join(work_dir, "baseline.db")
+    tuned_path = os.path.join(work_dir, "tuned.db")
+    try:
+        for path in (baseline_path, tuned_path):
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        start = time.perf_counter()
+        user_ids = build_dataset(baseline_path, args.rows, args.users)
+        print(f"生成 {args.rows} 条预测记录，耗时 {time.perf_counter() - start:.1f} 秒", file=sys.stderr)
+        shutil.copyfile(baseline_path, tuned_path)
+
+        baseline = sqlite3.connect(baseline_path)
+        baseline_timings = measure(baseline, user_ids, args.repeat, HOME_STATS_LEGACY)
+        baseline.close()
+
+        start = time.perf_counter()
+        tuned = Database(tuned_path)
+        migrate_time = time.perf_counter() - start
+        tuned_timings = measure(tuned.conn, user_ids, args.repeat, HOME_STATS)
+        tuned.close()
+
+        print(f"迁移（建立索引和统计表）耗时 {migrate_time:.1f} 秒")
+        print(f"{'查询':<20}{'默认配置 (ms)':>16}{'WAL + 索引 (ms)':>18}{'加速比':>10}")
+        for label, before in baseline_timings.items():
+            after = tuned_timings[label]
+            print(f"{label:<20}{before:>16.3f}{after:>18.3f}{before / max(after, 1e-9):>9.1f}x")
+    finally:
+        if not args.dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
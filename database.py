@@ -0,0 +1,893 @@
+import argparse
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+
+# 连接参数：WAL 下读写互不阻塞，synchronous=NORMAL 在 WAL 中仍能保证崩溃后数据库一致
+PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -64000),  # 负数表示 KiB，约 64 MB 页缓存
+    ("mmap_size", 256 * 1024 * 1024),
+    ("temp_store", "MEMORY"),
+    ("analysis_limit", 1000),  # ANALYZE 每个索引只抽样约 1000 行，大表上也能很快完成
+)
+
+# 主页统计：stats 表只有 ID = 1 一行，计数由触发器随增删同步维护
+STATS_COUNTERS = (
+    ("USER_COUNT", "user"),
+    ("ADMIN_COUNT", "admin"),
+    ("FEEDBACK_COUNT", "serve"),
+    ("PREDICTION_COUNT", "prediction"),
+)
+STATS_COLUMNS = tuple(column for column, _ in STATS_COUNTERS) + ("LATEST_NOTICE", "LATEST_NOTICE_TIME")
+# 按各表的实际内容计算统计值，用于初始化、一致性检查和重建
+STATS_ACTUAL = "SELECT " + ", ".join(
+    [f"(SELECT COUNT(*) FROM {table})" for _, table in STATS_COUNTERS]
+    + ["(SELECT NOTICE FROM notice ORDER BY TIME DESC LIMIT 1)",
+       "(SELECT TIME FROM notice ORDER BY TIME DESC LIMIT 1)"])
+STATS_REBUILD = f"INSERT OR REPLACE INTO stats (ID, {', '.join(STATS_COLUMNS)}) SELECT 1, * FROM ({STATS_ACTUAL})"
+
+
+def _stats_migration():
+    statements = [
+        "CREATE TABLE IF NOT EXISTS stats (ID INTEGER PRIMARY KEY CHECK (ID = 1), "
+        + ", ".join(f"{column} INTEGER NOT NULL DEFAULT 0" for column, _ in STATS_COUNTERS)
+        + ", LATEST_NOTICE TEXT, LATEST_NOTICE_TIME TEXT)",
+        STATS_REBUILD,
+    ]
+    for column, table in STATS_COUNTERS:
+        for event, delta in (("INSERT", "+ 1"), ("DELETE", "- 1")):
+            statements.append(
+                f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_stats AFTER {event} ON {table} "
+                f"BEGIN UPDATE stats SET {column} = {column} {delta} WHERE ID = 1; END")
+    # 新公告不早于当前最新公告时直接替换；删除或修改公告时沿 TIME 索引重新取最新一条
+    statements.append(
+        "CREATE TRIGGER IF NOT EXISTS trg_notice_insert_stats AFTER INSERT ON notice "
+        "WHEN NEW.TIME >= IFNULL((SELECT LATEST_NOTICE_TIME FROM stats WHERE ID = 1), '') "
+        "BEGIN UPDATE stats SET LATEST_NOTICE = NEW.NOTICE, LATEST_NOTICE_TIME = NEW.TIME WHERE ID = 1; END")
+    for event in ("DELETE", "UPDATE"):
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS trg_notice_{event.lower()}_stats AFTER {event} ON notice "
+            "BEGIN UPDATE stats SET "
+            "LATEST_NOTICE = (SELECT NOTICE FROM notice ORDER BY TIME DESC LIMIT 1), "
+            "LATEST_NOTICE_TIME = (SELECT TIME FROM notice ORDER BY TIME DESC LIMIT 1) WHERE ID = 1; END")
+    return tuple(statements)
+
+
+# 预测记录汇总表：表名 -> (主键列, 由 prediction 行计算主键的表达式)；写入预测时由触发器累加
+# PREDICTTIME 为 UTC 时间，按本地时间划分日期和小时，每天从本地零点开始
+ROLLUP_DAY = "date({row}.PREDICTTIME, 'localtime')"
+ROLLUP_HOUR = "strftime('%Y-%m-%d %H', {row}.PREDICTTIME, 'localtime')"
+ROLLUPS = {
+    "rollup_daily_breed": (("DAY", "RESULT"), (ROLLUP_DAY, "IFNULL({row}.RESULT, '')")),
+    "rollup_daily_user": (("DAY", "USERID"), (ROLLUP_DAY, "IFNULL({row}.USERID, '')")),
+    "rollup_hourly": (("HOUR",), (ROLLUP_HOUR,)),
+    # 不限日期的用户排行直接读取累计值，不必汇总每个用户每天的记录
+    "rollup_user": (("USERID",), ("IFNULL({row}.USERID, '')",)),
+}
+
+
+def _rollup_rebuild(table):
+    """按 prediction 表的实际内容重新计算一张汇总表的语句"""
+    columns, expressions = ROLLUPS[table]
+    keys = ", ".join(expression.format(row="prediction") for expression in expressions)
+    return (f"INSERT INTO {table} ({', '.join(columns)}, COUNT) "
+            f"SELECT {keys}, COUNT(*) FROM prediction GROUP BY {keys}")
+
+
+def _rollup_migration():
+    statements = []
+    for table, (columns, expressions) in ROLLUPS.items():
+        statements.append(
+            f"CREATE TABLE IF NOT EXISTS {table} ({' TEXT NOT NULL, '.join(columns)} TEXT NOT NULL, "
+            f"COUNT INTEGER NOT NULL, PRIMARY KEY ({', '.join(columns)})) WITHOUT ROWID")
+        statements.append(_rollup_rebuild(table))
+        new_keys = ", ".join(expression.format(row="NEW") for expression in expressions)
+        old_match = " AND ".join(f"{column} = {expression.format(row='OLD')}"
+                                 for column, expression in zip(columns, expressions))
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS trg_prediction_insert_{table} AFTER INSERT ON prediction BEGIN "
+            f"INSERT INTO {table} ({', '.join(columns)}, COUNT) VALUES ({new_keys}, 1) "
+            f"ON CONFLICT ({', '.join(columns)}) DO UPDATE SET COUNT = COUNT + 1; END")
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS trg_prediction_delete_{table} AFTER DELETE ON prediction BEGIN "
+            f"UPDATE {table} SET COUNT = COUNT - 1 WHERE {old_match}; "
+            f"DELETE FROM {table} WHERE {old_match} AND COUNT <= 0; END")
+    return tuple(statements)
+
+
+def _rollup_update_migration():
+    """修改预测记录的犬种、用户或时间时，从原来的汇总键减一、向新的汇总键加一，并按现有记录重算一次汇总"""
+    statements = []
+    for table, (columns, expressions) in ROLLUPS.items():
+        new_keys = ", ".join(expression.format(row="NEW") for expression in expressions)
+        old_match = " AND ".join(f"{column} = {expression.format(row='OLD')}"
+                                 for column, expression in zip(columns, expressions))
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS trg_prediction_update_{table} "
+            f"AFTER UPDATE OF RESULT, USERID, PREDICTTIME ON prediction BEGIN "
+            f"UPDATE {table} SET COUNT = COUNT - 1 WHERE {old_match}; "
+            f"DELETE FROM {table} WHERE {old_match} AND COUNT <= 0; "
+            f"INSERT INTO {table} ({', '.join(columns)}, COUNT) VALUES ({new_keys}, 1) "
+            f"ON CONFLICT ({', '.join(columns)}) DO UPDATE SET COUNT = COUNT + 1; END")
+        # 此前的修改没有同步到汇总表，重算一次
+        statements.append(f"DELETE FROM {table}")
+        statements.append(_rollup_rebuild(table))
+    return tuple(statements)
+
+
+# 识别结果缓存表：按图片内容哈希和模型指纹保存结果；缓存放在单独的文件时只建这一张表
+RESULT_CACHE_SCHEMA = ("CREATE TABLE IF NOT EXISTS result_cache (HASH TEXT, MODEL TEXT, RESULT TEXT, CONFIDENCE REAL, "
+                       "BOXES TEXT, CREATED TEXT, PRIMARY KEY (HASH, MODEL))")
+
+
+def _rollup_local_time_migration():
+    """按本地时间重新分桶：删除按 UTC 分桶的触发器和汇总数据，再按当前 ROLLUPS 重新建立"""
+    statements = []
+    for table in ROLLUPS:
+        for event in ("insert", "delete"):
+            statements.append(f"DROP TRIGGER IF EXISTS trg_prediction_{event}_{table}")
+        statements.append(f"DELETE FROM {table}")
+    return tuple(statements) + _rollup_migration()
+
+
+# 版本化迁移：(目标版本, 语句列表)，按 PRAGMA user_version 依次执行尚未执行的迁移，只追加、不修改已发布的迁移
+MIGRATIONS = (
+    (1, (
+        "CREATE INDEX IF NOT EXISTS idx_prediction_user_time ON prediction (USERID, PREDICTTIME)",
+        "CREATE INDEX IF NOT EXISTS idx_serve_user_finish ON serve (USERID, FINISH)",
+        "CREATE INDEX IF NOT EXISTS idx_notice_time ON notice (TIME)",
+    )),
+    (2, (
+        "CREATE INDEX IF NOT EXISTS idx_prediction_result_time ON prediction (RESULT, PREDICTTIME)",
+        "CREATE INDEX IF NOT EXISTS idx_prediction_time ON prediction (PREDICTTIME)",
+        # 多个筛选条件可选不同索引时，查询规划器依靠统计信息选出选择性最高的那个
+        "ANALYZE prediction",
+    )),
+    (3, _stats_migration()),
+    # 用户和管理员ID由序列表分配，从现有最大ID之后开始（不小于 1001），注册时不再扫描整张表
+    (4, (
+        "CREATE TABLE IF NOT EXISTS sequence (NAME TEXT PRIMARY KEY, NEXT_VALUE INTEGER NOT NULL)",
+        "INSERT OR IGNORE INTO sequence (NAME, NEXT_VALUE) "
+        "SELECT 'user', MAX(IFNULL(MAX(CAST(UID AS INTEGER)) + 1, 1001), 1001) FROM user",
+        "INSERT OR IGNORE INTO sequence (NAME, NEXT_VALUE) "
+        "SELECT 'admin', MAX(IFNULL(MAX(CAST(AID AS INTEGER)) + 1, 1001), 1001) FROM admin",
+    )),
+    (5, _rollup_migration()),
+    # 识别结果缓存：按图片内容哈希和模型指纹保存结果，写入经由 PredictionWriter，与预测记录共用一个写连接
+    (6, (RESULT_CACHE_SCHEMA,)),
+    (7, _rollup_local_time_migration()),
+    (8, _rollup_update_migration()),
+)
+
+# 预测记录的排序方式 -> 排序列；列顺序与索引一致，最后再按 rowid 保证顺序唯一，用于键集分页
+PREDICTION_SORTS = {
+    "rowid": (),
+    "time": ("PREDICTTIME",),
+    "user": ("USERID", "PREDICTTIME"),
+    "result": ("RESULT", "PREDICTTIME"),
+}
+PREDICTION_COLUMNS = ("rowid", "PREDICTID", "USERID", "IMAGEPATH", "RESULT", "PREDICTTIME")
+
+
+def _apply_pragmas(conn):
+    for name, value in PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value}").fetchall()
+
+
+# 预测记录写入线程：每次提交的一组记录作为一项进入队列，攒够 batch_size 条或等待满 window 秒后在一个事务中提交；
+# 每项各用一个保存点，一组记录要么全部写入、要么全部不写，不会被拆到两次提交中
+class PredictionWriter:
+    PREDICTION = "prediction"
+    INSERT_PREDICTION = ("INSERT INTO prediction (PREDICTID, USERID, IMAGEPATH, RESULT, PREDICTTIME) "
+                         "VALUES (?, ?, ?, ?, ?)")
+
+    def __init__(self, db_name, batch_size=256, window=0.2):
+        """初始化写入器，写入线程在第一次提交时启动并使用自己的数据库连接"""
+        self.db_name = db_name
+        self.batch_size = batch_size
+        self.window = window
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        # committed / failed 只统计预测记录；submit_rows 提交的其他写入按 kind 分别计数
+        self.committed = 0
+        self.batches = 0
+        self.failed = 0
+        self.other_counts = {}  # kind -> {"committed": 行数, "failed": 行数}
+        self.last_commit_ms = 0.0
+        self.max_commit_ms = 0.0
+        self._total_commit_ms = 0.0
+
+    def submit(self, user_id, image_path, result):
+        """提交一条预测记录，立即返回；预测时间取提交时刻而不是写库时刻"""
+        self.submit_many([(user_id, image_path, result)])
+
+    def submit_many(self, records):
+        """提交一组 (用户ID, 图片路径, 预测结果) 记录，立即返回；这组记录在同一个事务中写入"""
+        predict_time = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+        rows = [(str(uuid.uuid4()), user_id, image_path, result, predict_time)
+                for user_id, image_path, result in records]
+        if rows:
+            self._enqueue(self.PREDICTION, self.INSERT_PREDICTION, rows)
+
+    def submit_rows(self, kind, statement, rows):
+        """提交其他表的一组写入，与预测记录一起分组提交，用于让同一数据库文件只有一个写连接
+
+        kind 标明写入的类别，写入行数计入 other_counts[kind]，不计入预测记录的统计。
+        """
+        if rows:
+            self._enqueue(kind, statement, list(rows))
+
+    def _enqueue(self, kind, statement, rows):
+        with self._lock:
+            # 写入线程意外退出后重新启动，不让后续记录积压在队列中
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="PredictionWriter", daemon=True)
+                self._thread.start()
+        self._queue.put((kind, statement, rows))
+
+    def flush(self):
+        """等待队列中已提交的记录全部写入；写入线程已退出时不再等待"""
+        thread = self._thread
+        if thread is None:
+            return
+        done = self._queue.all_tasks_done
+        with done:
+            while self._queue.unfinished_tasks and thread.is_alive():
+                done.wait(0.1)
+        if not thread.is_alive() and self._queue.unfinished_tasks:
+            print(f"预测记录写入线程已退出，{self._queue.qsize()} 组记录未写入")
+
+    def close(self):
+        """写完队列中剩余的记录后停止写入线程"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join()
+
+    def metrics(self):
+        """返回队列深度和提交耗时统计"""
+        return {
+            "queue_depth": self._queue.qsize(),
+            "committed": self.committed,
+            "batches": self.batches,
+            "failed": self.failed,
+            "other": {kind: dict(counts) for kind, counts in self.other_counts.items()},
+            "last_commit_ms": self.last_commit_ms,
+            "avg_commit_ms": self._total_commit_ms / self.batches if self.batches else 0.0,
+            "max_commit_ms": self.max_commit_ms,
+        }
+
+    def _collect(self):
+        """阻塞等待第一项，再在时间窗口内尽量凑满 batch_size 条记录；返回 (项列表, 是否收到停止标记)"""
+        item = self._queue.get()
+        if item is None:
+            self._queue.task_done()
+            return [], True
+        items = [item]
+        rows = len(item[2])
+        deadline = time.monotonic() + self.window
+        while rows < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.task_done()
+                return items, True
+            items.append(item)
+            rows += len(item[2])
+        return items, False
+
+    def _count(self, kind, rows, ok):
+        if kind == self.PREDICTION:
+            if ok:
+                self.committed += rows
+            else:
+                self.failed += rows
+        else:
+            counts = self.other_counts.setdefault(kind, {"committed": 0, "failed": 0})
+            counts["committed" if ok else "failed"] += rows
+
+    def _run(self):
+        conn = None
+        try:
+            # 手动管理事务，保存点才能嵌套在整批提交的事务中
+            conn = sqlite3.connect(self.db_name, isolation_level=None)
+            _apply_pragmas(conn)
+        except sqlite3.Error as e:
+            print("预测记录写入线程无法打开数据库：", e)
+            if conn is not None:
+                conn.close()
+                conn = None
+        try:
+            # 打不开数据库时仍继续取出队列中的记录并记为失败，flush 不会一直等待
+            while True:
+                items, stop = self._collect()
+                if items:
+                    self._commit(conn, items)
+                if stop:
+                    return
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _commit(self, conn, items):
+        start = time.perf_counter()
+        written = set()  # 成功写入的项的下标
+        try:
+            if conn is None:
+                raise sqlite3.OperationalError("数据库未打开")
+            conn.execute("BEGIN")
+            try:
+                for i, (kind, statement, rows) in enumerate(items):
+                    conn.execute("SAVEPOINT item")
+                    try:
+                        conn.executemany(statement, rows)
+                        written.add(i)
+                    except sqlite3.Error as e:
+                        # 只回滚这一组，同一批中的其他组照常提交
+                        conn.execute("ROLLBACK TO item")
+                        print(f"写入失败（{kind}）：", e)
+                    conn.execute("RELEASE item")
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            written.clear()
+            print("写入队列提交失败：", e)
+        finally:
+            for i, (kind, _, rows) in enumerate(items):
+                self._count(kind, len(rows), i in written)
+            elapsed = (time.perf_counter() - start) * 1000
+            self.batches += 1
+            self.last_commit_ms = elapsed
+            self.max_commit_ms = max(self.max_commit_ms, elapsed)
+            self._total_commit_ms += elapsed
+            for _ in items:
+                self._queue.task_done()
+
+
+def open_result_cache_writer(db_name):
+    """在单独的缓存数据库中只创建 result_cache 表，返回写入该文件的 PredictionWriter，失败时返回 None"""
+    conn = None
+    try:
+        conn = sqlite3.connect(db_name)
+        _apply_pragmas(conn)
+        conn.execute(RESULT_CACHE_SCHEMA)
+        conn.commit()
+    except sqlite3.Error as e:
+        print("结果缓存数据库创建失败：", e)
+        return None
+    finally:
+        if conn is not None:
+            conn.close()
+    return PredictionWriter(db_name)
+
+
+# 数据库操作类
+class Database:
+    def __init__(self, db_name):
+        """初始化数据库连接并创建所有必要的表"""
+        # 连接、建表或迁移失败时保持为 None，close 和写入方法据此跳过
+        self.conn = None
+        self.prediction_writer = None
+        try:
+            # 常用查询均为固定的 SQL 文本，语句缓存使其只编译一次
+            self.conn = sqlite3.connect(db_name, cached_statements=256)
+            self.cursor = self.conn.cursor()
+            _apply_pragmas(self.conn)
+
+            # 创建用户表（仅限普通用户）
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS user (
+                    UID TEXT PRIMARY KEY,
+                    UNAME TEXT,
+                    UIDENTITY TEXT,
+                    UPD TEXT,
+                    EMAIL TEXT
+                )
+            """)
+
+            # 创建管理员表
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS admin (
+                    AID TEXT PRIMARY KEY,
+                    ANAME TEXT,
+                    APD TEXT,
+                    EMAIL TEXT
+                )
+            """)
+
+            # 创建预测记录表
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS prediction (
+                    PREDICTID TEXT PRIMARY KEY,
+                    USERID TEXT,
+                    IMAGEPATH TEXT,
+                    RESULT TEXT,
+                    PREDICTTIME TEXT
+                )
+            """)
+
+            # 创建反馈表
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS serve (
+                    SERVEID TEXT PRIMARY KEY,
+                    USERID TEXT,
+                    FEEDBACK TEXT,
+                    SERVETIME TEXT,
+                    FINISH BOOLEAN
+                )
+            """)
+
+            # 创建公告表
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS notice (
+                    NOTICE TEXT,
+                    OPRATORID TEXT,
+                    TIME TEXT
+                )
+            """)
+
+            self.conn.commit()
+            self._migrate()
+            # 预测记录由后台线程分组提交，调用方不必等待磁盘同步
+            self.prediction_writer = PredictionWriter(db_name)
+            print("数据库连接成功，所有表已创建")
+        except sqlite3.Error as e:
+            print("数据库连接或表创建失败：", e)
+
+    def _migrate(self):
+        """执行版本号高于当前 user_version 的迁移，每个迁移在单独的事务中完成"""
+        current = self.cursor.execute("PRAGMA user_version").fetchone()[0]
+        for version, statements in MIGRATIONS:
+            if version <= current:
+                continue
+            with self.conn:
+                for statement in statements:
+                    self.conn.execute(statement)
+                self.conn.execute(f"PRAGMA user_version = {version}")
+            print(f"数据库已迁移到版本 {version}")
+
+    def get_all_predictions(self):
+        """获取所有预测记录"""
+        self.flush_predictions()
+        try:
+            self.cursor.execute("SELECT PREDICTID, USERID, IMAGEPATH, RESULT, PREDICTTIME FROM prediction")
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            print("获取预测记录失败：", e)
+            return []
+
+    @staticmethod
+    def _prediction_filter(user_id=None, result=None, start=None, end=None):
+        """生成预测记录的筛选条件，start、end 为 PREDICTTIME 的下界（含）和上界（不含）"""
+        clauses, params = [], []
+        for clause, value in (("USERID = ?", user_id), ("RESULT = ?", result),
+                              ("PREDICTTIME >= ?", start), ("PREDICTTIME < ?", end)):
+            if value:
+                clauses.append(clause)
+                params.append(value)
+        return clauses, params
+
+    def get_predictions_page(self, after=None, limit=200, sort="rowid", descending=False, **filters):
+        """按筛选条件和排序方式分页获取预测记录，返回 (rowid, 预测ID, 用户ID, 图片路径, 预测结果, 预测时间) 列表
+
+        after 为上一页的最后一行，按 (排序列..., rowid) 的键集定位下一页，翻到多深都不需要跳过前面的行。
+        sort 取 PREDICTION_SORTS 中的键；filters 支持 user_id、result、start、end，由索引完成筛选和排序。
+        """
+        if after is None:
+            self.flush_predictions()
+        keys = PREDICTION_SORTS[sort] + ("rowid",)
+        clauses, params = self._prediction_filter(**filters)
+        if after is not None:
+            operator = "<" if descending else ">"
+            clauses.append(f"({', '.join(keys)}) {operator} ({', '.join('?' * len(keys))})")
+            params.extend(after[PREDICTION_COLUMNS.index(key)] for key in keys)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        direction = " DESC" if descending else ""
+        order = ", ".join(key + direction for key in keys)
+        try:
+            self.cursor.execute(
+                f"SELECT {', '.join(PREDICTION_COLUMNS)} FROM prediction {where}ORDER BY {order} LIMIT ?",
+                params + [limit])
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            print("分页获取预测记录失败：", e)
+            return []
+
+    def count_predictions(self, **filters):
+        """统计满足筛选条件的预测记录数"""
+        clauses, params = self._prediction_filter(**filters)
+        if not clauses:
+            return self.get_prediction_count()
+        try:
+            self.cursor.execute(f"SELECT COUNT(*) FROM prediction WHERE {' AND '.join(clauses)}", params)
+            return self.cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            print("统计预测记录失败：", e)
+            return 0
+
+    def get_prediction_results(self):
+        """获取出现过的所有预测结果（犬种），沿 RESULT 索引逐个跳到下一个不同的值，不扫描整张表"""
+        try:
+            self.cursor.execute("""
+                WITH RECURSIVE results(RESULT) AS (
+                    SELECT MIN(RESULT) FROM prediction
+                    UNION ALL
+                    SELECT (SELECT MIN(RESULT) FROM prediction WHERE RESULT > results.RESULT)
+                    FROM results WHERE results.RESULT IS NOT NULL
+                )
+                SELECT RESULT FROM results WHERE RESULT IS NOT NULL
+            """)
+            return [row[0] for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            print("获取预测结果列表失败：", e)
+            return []
+
+    def _peek_sequence(self, name):
+        """查看序列的下一个值但不占用，用于在注册页面提示"""
+        try:
+            self.cursor.execute("SELECT NEXT_VALUE FROM sequence WHERE NAME = ?", (name,))
+            row = self.cursor.fetchone()
+            return str(row[0]) if row else "1001"
+        except sqlite3.Error as e:
+            print(f"获取下一个{name} ID失败：", e)
+            return "1001"  # 默认返回1001以确保系统继续运行
+
+    def _insert_with_id(self, sequence_name, sql, params):
+        """在一个写事务中从序列取号并插入记录，返回分配的ID
+
+        BEGIN IMMEDIATE 在取号前就拿到写锁，多个连接或进程同时注册时依次取号，ID 不会重复。
+        """
+        self.conn.commit()  # 结束可能未提交的隐式事务，才能显式开始写事务
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            new_id = self.conn.execute("SELECT NEXT_VALUE FROM sequence WHERE NAME = ?",
+                                       (sequence_name,)).fetchone()[0]
+            self.conn.execute("UPDATE sequence SET NEXT_VALUE = NEXT_VALUE + 1 WHERE NAME = ?", (sequence_name,))
+            self.conn.execute(sql, (str(new_id),) + tuple(params))
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        return str(new_id)
+
+    def get_next_uid(self):
+        """获取下一个可用的用户ID，从1001开始自增"""
+        return self._peek_sequence("user")
+
+    def get_next_aid(self):
+        """获取下一个可用的管理员ID，从1001开始自增"""
+        return self._peek_sequence("admin")
+
+    def add_prediction(self, user_id, image_path, result):
+        """添加预测记录，交给写入线程分组提交，不等待写库完成"""
+        self.add_predictions([(user_id, image_path, result)])
+
+    def add_predictions(self, records):
+        """批量添加预测记录，records 为 (用户ID, 图片路径, 预测结果) 列表，整批在同一个事务中写入"""
+        if self.prediction_writer is None:
+            print("数据库未连接，预测记录未保存")
+            return
+        self.prediction_writer.submit_many(records)
+
+    def flush_predictions(self):
+        """等待已提交的预测记录全部写入，之后的查询可以读到这些记录"""
+        if self.prediction_writer is not None:
+            self.prediction_writer.flush()
+
+    def get_home_stats(self):
+        """一次主键查询获取主页统计：用户和管理员总数、反馈总数、预测次数和最新公告（无公告时为 None）"""
+        self.flush_predictions()
+        try:
+            self.cursor.execute(
+                "SELECT USER_COUNT + ADMIN_COUNT, FEEDBACK_COUNT, PREDICTION_COUNT, LATEST_NOTICE FROM stats "
+                "WHERE ID = 1")
+            row = self.cursor.fetchone()
+        except sqlite3.Error as e:
+            print("获取主页统计失败：", e)
+            row = None
+        if row is None:
+            return {"user_count": 0, "feedback_count": 0, "prediction_count": 0, "latest_notice": None}
+        user_count, feedback_count, prediction_count, latest_notice = row
+        return {"user_count": user_count, "feedback_count": feedback_count,
+                "prediction_count": prediction_count, "latest_notice": latest_notice}
+
+    def check_stats(self, repair=False):
+        """比较 stats 表与各表的实际内容，返回不一致的列 {列名: (记录值, 实际值)}；repair 为 True 时按实际内容重建"""
+        self.flush_predictions()
+        try:
+            stored = self.cursor.execute(f"SELECT {', '.join(STATS_COLUMNS)} FROM stats WHERE ID = 1").fetchone()
+            actual = self.cursor.execute(STATS_ACTUAL).fetchone()
+            stored = stored or (None,) * len(STATS_COLUMNS)
+            mismatches = {column: (before, after)
+                          for column, before, after in zip(STATS_COLUMNS, stored, actual) if before != after}
+            if repair and mismatches:
+                with self.conn:
+                    self.conn.execute(STATS_REBUILD)
+                print("统计表已重建")
+            return mismatches
+        except sqlite3.Error as e:
+            print("检查统计表失败：", e)
+            return {}
+
+    def rebuild_rollups(self):
+        """按 prediction 表的实际内容重建所有汇总表"""
+        self.flush_predictions()
+        try:
+            with self.conn:
+                for table in ROLLUPS:
+                    self.conn.execute(f"DELETE FROM {table}")
+                    self.conn.execute(_rollup_rebuild(table))
+            print("汇总表已重建")
+        except sqlite3.Error as e:
+            print("重建汇总表失败：", e)
+
+    def _query_rollup(self, sql, params, label):
+        self.flush_predictions()
+        try:
+            self.cursor.execute(sql, params)
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"获取{label}失败：", e)
+            return []
+
+    def get_breed_totals(self, start_day="", limit=20):
+        """按汇总表统计 start_day（YYYY-MM-DD，含）以来各犬种的预测次数，按次数降序返回 [(犬种, 次数)]"""
+        return self._query_rollup(
+            "SELECT RESULT, SUM(COUNT) AS TOTAL FROM rollup_daily_breed WHERE DAY >= ? "
+            "GROUP BY RESULT ORDER BY TOTAL DESC LIMIT ?", (start_day, limit), "犬种统计")
+
+    def get_user_totals(self, start_day="", limit=10):
+        """按汇总表统计 start_day 以来各用户的预测次数，按次数降序返回 [(用户ID, 次数)]"""
+        if not start_day:
+            return self._query_rollup("SELECT USERID, COUNT FROM rollup_user ORDER BY COUNT DESC LIMIT ?",
+                                      (limit,), "用户统计")
+        return self._query_rollup(
+            "SELECT USERID, SUM(COUNT) AS TOTAL FROM rollup_daily_user WHERE DAY >= ? "
+            "GROUP BY USERID ORDER BY TOTAL DESC LIMIT ?", (start_day, limit), "用户统计")
+
+    def get_daily_counts(self, start_day=""):
+        """按汇总表返回 start_day 以来每天的预测次数 [(YYYY-MM-DD, 次数)]"""
+        return self._query_rollup(
+            "SELECT DAY, SUM(COUNT) FROM rollup_daily_breed WHERE DAY >= ? GROUP BY DAY ORDER BY DAY",
+            (start_day,), "每日统计")
+
+    def get_hourly_counts(self, start_day=""):
+        """按汇总表返回 start_day 以来每小时的预测次数 [(YYYY-MM-DD HH, 次数)]"""
+        return self._query_rollup(
+            "SELECT HOUR, COUNT FROM rollup_hourly WHERE HOUR >= ? ORDER BY HOUR", (start_day,), "每小时统计")
+
+    def get_user_count(self):
+        """获取用户和管理员总数"""
+        return self.get_home_stats()["user_count"]
+
+    def get_feedback_count(self):
+        """获取反馈总数"""
+        return self.get_home_stats()["feedback_count"]
+
+    def get_prediction_count(self):
+        """获取预测次数"""
+        return self.get_home_stats()["prediction_count"]
+
+    def get_latest_notice(self):
+        """获取最新公告，返回 (公告内容,)，没有公告时返回 None"""
+        try:
+            self.cursor.execute("SELECT LATEST_NOTICE FROM stats WHERE ID = 1 AND LATEST_NOTICE_TIME IS NOT NULL")
+            return self.cursor.fetchone()
+        except sqlite3.Error as e:
+            print("获取最新公告失败：", e)
+            return None
+
+    def add_feedback(self, serve_id, user_id, feedback):
+        """添加用户反馈"""
+        try:
+            self.cursor.execute(
+                "INSERT INTO serve (SERVEID, USERID, FEEDBACK, SERVETIME, FINISH) VALUES (?, ?, ?, datetime('now'), ?)",
+                (serve_id, user_id, feedback, False))
+            self.conn.commit()
+            print("反馈提交成功")
+        except sqlite3.Error as e:
+            print("反馈提交失败：", e)
+
+    def update_feedback_status(self, serve_id):
+        """更新反馈状态为已处理"""
+        try:
+            self.cursor.execute("UPDATE serve SET FINISH = ? WHERE SERVEID = ?", (True, serve_id))
+            self.conn.commit()
+            print("反馈状态更新成功")
+        except sqlite3.Error as e:
+            print("反馈状态更新失败：", e)
+
+    def get_feedback_by_user(self, user_id):
+        """获取指定用户的反馈记录"""
+        try:
+            self.cursor.execute("SELECT * FROM serve WHERE USERID = ?", (user_id,))
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            print("获取用户反馈失败：", e)
+            return []
+
+    def get_all_feedback(self):
+        """获取所有反馈记录"""
+        try:
+            self.cursor.execute("SELECT * FROM serve")
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            print("获取反馈失败：", e)
+            return []
+
+    def update_notice(self, notice, operator_id):
+        """更新公告内容"""
+        try:
+            self.cursor.execute("INSERT INTO notice (NOTICE, OPRATORID, TIME) VALUES (?, ?, datetime('now'))",
+                                (notice, operator_id))
+            self.conn.commit()
+            print("公告更新成功")
+        except sqlite3.Error as e:
+            print("公告更新失败：", e)
+
+    def add_user(self, name, identity, password, email):
+        """添加新用户（仅普通用户）"""
+        try:
+            uid = self._insert_with_id(
+                "user", "INSERT INTO user (UID, UNAME, UIDENTITY, UPD, EMAIL) VALUES (?, ?, ?, ?, ?)",
+                (name, identity, password, email))
+            print("用户添加成功")
+            return uid
+        except sqlite3.Error as e:
+            print("用户添加失败：", e)
+            return None
+
+    def add_admin(self, name, password, email):
+        """添加新管理员"""
+        try:
+            aid = self._insert_with_id("admin", "INSERT INTO admin (AID, ANAME, APD, EMAIL) VALUES (?, ?, ?, ?)",
+                                       (name, password, email))
+            print("管理员添加成功")
+            return aid
+        except sqlite3.Error as e:
+            print("管理员添加失败：", e)
+            return None
+
+    def get_user(self, uid):
+        """根据用户ID获取用户信息"""
+        try:
+            self.cursor.execute("SELECT UID, UNAME, UIDENTITY, UPD, EMAIL FROM user WHERE UID = ?", (uid,))
+            return self.cursor.fetchone()
+        except sqlite3.Error as e:
+            print("查询用户失败：", e)
+            return None
+
+    def get_admin(self, aid):
+        """根据管理员ID获取管理员信息"""
+        try:
+            self.cursor.execute("SELECT AID, ANAME, 'Administrator', APD, EMAIL FROM admin WHERE AID = ?", (aid,))
+            return self.cursor.fetchone()
+        except sqlite3.Error as e:
+            print("查询管理员失败：", e)
+            return None
+
+    def get_user_by_role_and_password(self, uid, name, identity, password):
+        """根据用户信息验证用户或管理员"""
+        try:
+            if identity == "Administrator":
+                self.cursor.execute(
+                    "SELECT AID, ANAME, 'Administrator', APD, EMAIL FROM admin WHERE AID = ? AND ANAME = ? AND APD = ?",
+                    (uid, name, password))
+            else:
+                self.cursor.execute(
+                    "SELECT UID, UNAME, UIDENTITY, UPD, EMAIL FROM user WHERE UID = ? AND UNAME = ? AND UIDENTITY = ? AND UPD = ?",
+                    (uid, name, identity, password))
+            return self.cursor.fetchone()
+        except sqlite3.Error as e:
+            print("查询用户失败：", e)
+            return None
+
+    def get_all_users(self):
+        """获取所有普通用户信息"""
+        try:
+            self.cursor.execute("SELECT UID, UNAME, UIDENTITY, UPD, EMAIL FROM user")
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            print("查询所有用户失败：", e)
+            return []
+
+    def get_all_admins(self):
+        """获取所有管理员信息"""
+        try:
+            self.cursor.execute("SELECT AID, ANAME, 'Administrator', APD, EMAIL FROM admin")
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            print("查询所有管理员失败：", e)
+            return []
+
+    def get_users_by_role(self, role):
+        """根据角色获取用户信息"""
+        try:
+            if role == "Administrator":
+                self.cursor.execute("SELECT AID, ANAME, 'Administrator', APD, EMAIL FROM admin")
+            else:
+                self.cursor.execute("SELECT UID, UNAME, UIDENTITY, UPD, EMAIL FROM user WHERE UIDENTITY = ?", (role,))
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"查询{role}用户失败：", e)
+            return []
+
+    def update_user(self, uid, name, identity, password, email):
+        """更新用户信息"""
+        try:
+            self.cursor.execute("UPDATE user SET UNAME = ?, UIDENTITY = ?, UPD = ?, EMAIL = ? WHERE UID = ?",
+                                (name, identity, password, email, uid))
+            self.conn.commit()
+            print("用户信息更新成功")
+        except sqlite3.Error as e:
+            print("用户信息更新失败：", e)
+
+    def update_admin(self, aid, name, password, email):
+        """更新管理员信息"""
+        try:
+            self.cursor.execute("UPDATE admin SET ANAME = ?, APD = ?, EMAIL = ? WHERE AID = ?",
+                                (name, password, email, aid))
+            self.conn.commit()
+            print("管理员信息更新成功")
+        except sqlite3.Error as e:
+            print("管理员信息更新失败：", e)
+
+    def close(self):
+        """写完排队的预测记录后关闭数据库连接，关闭前让 SQLite 按需更新查询规划用的统计信息"""
+        if self.prediction_writer is not None:
+            self.prediction_writer.close()
+        if self.conn is None:
+            return
+        try:
+            self.conn.execute("PRAGMA optimize")
+        except sqlite3.Error as e:
+            print("数据库优化失败：", e)
+        self.conn.close()
+        print("数据库连接关闭")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="数据库维护工具")
+    parser.add_argument("command", choices=("check-stats", "rebuild-rollups"),
+                        help="check-stats：检查主页统计表与实际数据是否一致；rebuild-rollups：重建预测汇总表")
+    parser.add_argument("--db", default="database.db", help="数据库文件")
+    parser.add_argument("--repair", action="store_true", help="发现不一致时按实际数据重建")
+    args = parser.parse_args(argv)
+
+    db = Database(args.db)
+    if args.command == "rebuild-rollups":
+        try:
+            db.rebuild_rollups()
+        finally:
+            db.close()
+        return 0
+    try:
+        mismatches = db.check_stats(repair=args.repair)
+    finally:
+        db.close()
+    if not mismatches:
+        print("统计表与实际数据一致")
+        return 0
+    for column, (stored, actual) in mismatches.items():
+        print(f"{column}：记录值 {stored}，实际值 {actual}")
+    return 0 if args.repair else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
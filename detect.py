@@ -0,0 +1,214 @@
+"""命令行批量识别入口
+
+不依赖 PyQt6，可在没有图形界面的服务器上运行。示例：
+    python detect.py images/ "photos/**/*.jpg" --format csv --output results.csv --db database.db
+    python detect.py images/ --workers 4 --db database.db
+"""
+import argparse
+import contextlib
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from database import Database, open_result_cache_writer
+from model import BATCH_SIZE, MODEL_PATH, ResultCache, YOLOModel, result_cache
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def iter_image_paths(inputs):
+    """展开文件、目录和通配符，逐个产出图片路径"""
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        yield os.path.join(root, name)
+        elif glob.has_magic(item):
+            for path in sorted(glob.glob(item, recursive=True)):
+                if os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS):
+                    yield path
+        elif os.path.isfile(item):
+            yield item
+        else:
+            print(f"跳过不存在的输入：{item}", file=sys.stderr)
+
+
+def iter_chunks(iterable, size):
+    """把迭代器按固定大小分组"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def detect(model, paths, batch_size):
+    """流式识别图片，逐张产出结果字典"""
+    for chunk in iter_chunks(paths, batch_size):
+        for path, class_name, confidence, _ in model.predict_batch(chunk, batch_size, annotate=False):
+            yield {"image": path, "result": class_name, "confidence": confidence}
+
+
+# 多进程模式下每个工作进程各自加载一次的模型
+_worker_model = None
+
+
+def _init_worker(model_path, num_threads, cache_db_name):
+    """工作进程初始化：限制线程数并加载模型，cache_db_name 不为 None 时使用该数据库中的结果缓存"""
+    global _worker_model
+    # 工作进程的日志写到标准错误，标准输出只留给识别结果
+    sys.stdout = sys.stderr
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+    # 工作进程使用不绑定写入器的缓存，新结果暂存后随分片结果交回主进程
+    cache = ResultCache(cache_db_name) if cache_db_name is not None else None
+    _worker_model = YOLOModel(model_path=model_path, cache=cache)
+
+
+def _detect_shard(task):
+    """在工作进程中识别一个分片，返回 (进程号, 耗时, 结果列表, 待写入的结果缓存)"""
+    paths, batch_size = task
+    start = time.perf_counter()
+    records = list(detect(_worker_model, paths, batch_size))
+    cache_writes = _worker_model.cache.take_pending() if _worker_model.cache is not None else []
+    return os.getpid(), time.perf_counter() - start, records, cache_writes
+
+
+def detect_parallel(model_path, paths, batch_size, workers, worker_stats, use_cache=False):
+    """把图片分片交给多个进程识别，按输入顺序逐张产出结果字典
+
+    worker_stats 按进程号累计 [图片数, 耗时]，用于统计各进程吞吐量。
+    """
+    num_threads = max(1, (os.cpu_count() or workers) // workers)
+    shard_size = batch_size * 4
+    tasks = ((chunk, batch_size) for chunk in iter_chunks(paths, shard_size))
+    initargs = (model_path, num_threads, result_cache.db_name if use_cache else None)
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+        # imap 按提交顺序返回分片结果，空闲进程自动领取下一个分片
+        for pid, elapsed, records, cache_writes in pool.imap(_detect_shard, tasks):
+            result_cache.submit_pending(cache_writes)
+            stats = worker_stats.setdefault(pid, [0, 0.0])
+            stats[0] += len(records)
+            stats[1] += elapsed
+            yield from records
+
+
+class ResultWriter:
+    """按 JSONL 或 CSV 格式写出识别结果"""
+
+    FIELDS = ("image", "result", "confidence")
+
+    def __init__(self, stream, output_format):
+        self.stream = stream
+        self.output_format = output_format
+        self._csv = None
+        if output_format == "csv":
+            self._csv = csv.DictWriter(stream, fieldnames=self.FIELDS)
+            self._csv.writeheader()
+
+    def write(self, record):
+        if self._csv is not None:
+            self._csv.writerow(record)
+        else:
+            self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="犬类识别命令行批量检测")
+    parser.add_argument("inputs", nargs="+", help="图片文件、目录或通配符")
+    parser.add_argument("--model", default=MODEL_PATH, help="模型路径，默认读取 .env 中的 MODEL_PATH")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="每批送入网络的图片数")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl", help="输出格式")
+    parser.add_argument("--output", help="输出文件，默认写到标准输出")
+    parser.add_argument("--db", help="同时把识别结果写入该数据库的 prediction 表")
+    parser.add_argument("--user-id", default="cli", help="写入数据库时使用的用户ID")
+    parser.add_argument("--workers", type=int, default=1, help="并行识别的进程数，大于 1 时启用多进程模式")
+    parser.add_argument("--cache", action="store_true", help="使用识别结果缓存，跳过内容相同的图片")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    stream = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        # 模型和数据库的日志改写到标准错误，避免混入输出到标准输出的结果
+        with contextlib.redirect_stdout(sys.stderr):
+            return run(args, stream)
+    finally:
+        if args.output:
+            stream.close()
+
+
+def run(args, stream):
+    # 结果、数据库和结果缓存都只由主进程写入
+    db = Database(args.db) if args.db else None
+    cache_writer = None
+    if args.cache:
+        # 缓存与 --db 是同一文件时共用它的写入线程，否则只在缓存文件中建缓存表
+        same_file = db is not None and os.path.abspath(args.db) == os.path.abspath(result_cache.db_name)
+        cache_writer = db.prediction_writer if same_file else open_result_cache_writer(result_cache.db_name)
+        result_cache.attach(cache_writer)
+
+    paths = iter_image_paths(args.inputs)
+    worker_stats = {}
+    if args.workers > 1:
+        records = detect_parallel(args.model, paths, args.batch_size, args.workers, worker_stats, args.cache)
+    else:
+        model = YOLOModel(model_path=args.model, cache=result_cache if args.cache else None)
+        records = detect(model, paths, args.batch_size)
+    writer = ResultWriter(stream, args.format)
+
+    total = detected = 0
+    pending = []
+    start = time.perf_counter()
+    try:
+        for record in records:
+            writer.write(record)
+            total += 1
+            if record["result"] is not None:
+                detected += 1
+                pending.append((args.user_id, record["image"], record["result"]))
+            # 按批写库，每批只提交一次事务
+            if db is not None and len(pending) >= args.batch_size:
+                db.add_predictions(pending)
+                pending = []
+        if db is not None and pending:
+            db.add_predictions(pending)
+    finally:
+        if cache_writer is not None and (db is None or cache_writer is not db.prediction_writer):
+            cache_writer.close()
+        if db is not None:
+            db.close()
+
+    elapsed = time.perf_counter() - start
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"共处理 {total} 张图片，识别成功 {detected} 张，耗时 {elapsed:.2f} 秒，{rate:.2f} 张/秒", file=sys.stderr)
+    if db is not None and db.prediction_writer is not None:
+        metrics = db.prediction_writer.metrics()
+        print(f"  写库 {metrics['committed']} 条，{metrics['batches']} 次提交，"
+              f"平均 {metrics['avg_commit_ms']:.1f} ms，最长 {metrics['max_commit_ms']:.1f} ms", file=sys.stderr)
+    cache_counts = None
+    if cache_writer is not None:
+        cache_counts = cache_writer.metrics()["other"].get(ResultCache.WRITE_KIND)
+    if cache_counts:
+        print(f"  结果缓存写入 {cache_counts['committed']} 条，失败 {cache_counts['failed']} 条", file=sys.stderr)
+    for pid, (count, busy) in sorted(worker_stats.items()):
+        worker_rate = count / busy if busy > 0 else 0.0
+        print(f"  进程 {pid}：{count} 张，计算耗时 {busy:.2f} 秒，{worker_rate:.2f} 张/秒", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
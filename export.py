@@ -0,0 +1,268 @@
+"""模型导出工具
+
+把 best.pt 导出为 ONNX 或 OpenVINO 格式，并用样例图片校验导出模型与原模型的输出一致；
+也可以生成 INT8 量化的 ONNX 模型，并输出与 FP32 模型的准确率和速度对比报告。示例：
+    python export.py onnx --verify images/
+    python export.py openvino --model best.pt --imgsz 640 --verify a.jpg b.jpg
+    python export.py int8 --mode static --calib calib_images/ --report test_images/
+导出后把 .env 中的 MODEL_PATH 指向导出文件，或设置 MODEL_BACKEND=onnx / openvino 即可切换后端。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+from detect import iter_image_paths
+from model import MODEL_PATH, read_image
+
+
+def export_model(model_path, export_format, imgsz=640, dynamic=False):
+    """导出模型，返回导出文件（或目录）的路径"""
+    model = YOLO(model_path)
+    return model.export(format=export_format, imgsz=imgsz, dynamic=dynamic)
+
+
+def box_iou(box, boxes):
+    """计算一个框与一组框的 IoU"""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def _detections(model, frame, imgsz, conf):
+    result = model.predict(source=frame, imgsz=imgsz, conf=conf, save=False, verbose=False)[0]
+    boxes = result.boxes
+    return boxes.xyxy.cpu().numpy(), boxes.cls.cpu().numpy().astype(int), boxes.conf.cpu().numpy()
+
+
+def verify_export(reference_path, exported_path, image_paths, imgsz=640, conf=0.25, atol=0.02, min_iou=0.9):
+    """逐张比较两个模型的检测结果，返回 (是否一致, 不一致说明列表)
+
+    原模型的每个检测框都需要在导出模型中找到同类别、IoU 不低于 min_iou 且置信度差不超过 atol 的框，
+    检测数量也必须相同。
+    """
+    reference = YOLO(reference_path)
+    exported = YOLO(exported_path, task="detect")
+    problems = []
+    max_conf_diff = 0.0
+    for path in image_paths:
+        frame = read_image(path)
+        if frame is None:
+            continue
+        ref_boxes, ref_cls, ref_conf = _detections(reference, frame, imgsz, conf)
+        exp_boxes, exp_cls, exp_conf = _detections(exported, frame, imgsz, conf)
+        if len(ref_boxes) != len(exp_boxes):
+            problems.append(f"{path}：检测数量不同（{len(ref_boxes)} vs {len(exp_boxes)}）")
+            continue
+        for box, cls, score in zip(ref_boxes, ref_cls, ref_conf):
+            same_class = exp_cls == cls
+            if not same_class.any():
+                problems.append(f"{path}：导出模型缺少类别 {cls}")
+                break
+            ious = box_iou(box, exp_boxes[same_class])
+            best = int(np.argmax(ious))
+            conf_diff = abs(float(exp_conf[same_class][best]) - float(score))
+            max_conf_diff = max(max_conf_diff, conf_diff)
+            if ious[best] < min_iou or conf_diff > atol:
+                problems.append(f"{path}：类别 {cls} 的框 IoU={ious[best]:.3f}，置信度差 {conf_diff:.4f}")
+                break
+    print(f"最大置信度差：{max_conf_diff:.4f}")
+    return not problems, problems
+
+
+def letterbox(frame, size):
+    """按 YOLO 的预处理方式缩放并填充为 size×size，返回 NCHW、0~1 的 float32 输入"""
+    height, width = frame.shape[:2]
+    scale = min(size / height, size / width)
+    new_w, new_h = int(round(width * scale)), int(round(height * scale))
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top, left = (size - new_h) // 2, (size - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    tensor = canvas[:, :, ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+    return np.ascontiguousarray(tensor)
+
+
+class ImageCalibrationReader:
+    """静态量化的校准数据：逐张读取校准目录中的图片"""
+
+    def __init__(self, input_name, image_paths, imgsz, limit=200):
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self._paths = iter(image_paths[:limit])
+
+    def get_next(self):
+        for path in self._paths:
+            frame = read_image(path)
+            if frame is not None:
+                return {self.input_name: letterbox(frame, self.imgsz)}
+        return None
+
+    def rewind(self):
+        pass
+
+
+def quantize_model(fp32_onnx_path, output_path, mode="dynamic", calib_paths=(), imgsz=640):
+    """把 FP32 ONNX 模型量化为 INT8，保留 ultralytics 写入的类别名称等元数据"""
+    import onnx
+    from onnxruntime.quantization import QuantType, quantize_dynamic, quantize_static
+
+    if mode == "static":
+        if not calib_paths:
+            raise ValueError("静态量化需要提供校准图片")
+        input_name = onnx.load(fp32_onnx_path, load_external_data=False).graph.input[0].name
+        reader = ImageCalibrationReader(input_name, list(calib_paths), imgsz)
+        quantize_static(fp32_onnx_path, output_path, reader,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    else:
+        quantize_dynamic(fp32_onnx_path, output_path, weight_type=QuantType.QUInt8)
+
+    # ultralytics 依赖 metadata_props 中的 names / stride / imgsz，量化后补回
+    source = onnx.load(fp32_onnx_path, load_external_data=False)
+    quantized = onnx.load(output_path)
+    existing = {prop.key for prop in quantized.metadata_props}
+    for prop in source.metadata_props:
+        if prop.key not in existing:
+            quantized.metadata_props.add(key=prop.key, value=prop.value)
+    onnx.save(quantized, output_path)
+    return output_path
+
+
+def _top1(model, frame, imgsz):
+    """返回单张图片置信度最高的类别名、置信度和推理耗时（毫秒）"""
+    start = time.perf_counter()
+    result = model.predict(source=frame, imgsz=imgsz, conf=0.1, save=False, verbose=False)[0]
+    latency = (time.perf_counter() - start) * 1000
+    if len(result.boxes) == 0:
+        return None, 0.0, latency
+    return result.names[int(result.boxes.cls[0])], float(result.boxes.conf[0]), latency
+
+
+def compare_models(reference_path, candidate_path, image_paths, imgsz=640, warmup=3):
+    """对比两个模型的 top-1 犬种一致率和单张推理延迟，返回报告字典
+
+    一致率只统计至少一个模型检测到目标的图片，两者都没有检测结果的图片单独计入 both_empty。
+    """
+    reference = YOLO(reference_path)
+    candidate = YOLO(candidate_path, task="detect")
+    frames = [(path, read_image(path)) for path in image_paths]
+    frames = [(path, frame) for path, frame in frames if frame is not None]
+    if not frames:
+        raise ValueError("没有可用于对比的图片")
+    for _, frame in frames[:warmup]:
+        _top1(reference, frame, imgsz)
+        _top1(candidate, frame, imgsz)
+
+    agree = 0
+    both_empty = 0
+    conf_drops = []
+    latencies = {"reference": [], "candidate": []}
+    disagreements = []
+    for path, frame in frames:
+        ref_name, ref_conf, ref_ms = _top1(reference, frame, imgsz)
+        cand_name, cand_conf, cand_ms = _top1(candidate, frame, imgsz)
+        latencies["reference"].append(ref_ms)
+        latencies["candidate"].append(cand_ms)
+        if ref_name is None and cand_name is None:
+            # 两个模型都没有检测到目标时无从比较，单独计数，不计入一致率
+            both_empty += 1
+        elif ref_name == cand_name:
+            agree += 1
+            conf_drops.append(ref_conf - cand_conf)
+        else:
+            disagreements.append({"image": path, "reference": ref_name, "candidate": cand_name})
+
+    def summary(values):
+        values = np.asarray(values)
+        return {"mean_ms": float(values.mean()), "p50_ms": float(np.percentile(values, 50)),
+                "p95_ms": float(np.percentile(values, 95))}
+
+    reference_latency = summary(latencies["reference"])
+    candidate_latency = summary(latencies["candidate"])
+    compared = len(frames) - both_empty
+    return {
+        "reference": reference_path,
+        "candidate": candidate_path,
+        "images": len(frames),
+        "both_empty": both_empty,
+        "top1_agreement": agree / compared if compared else 0.0,
+        "mean_confidence_drop": float(np.mean(conf_drops)) if conf_drops else 0.0,
+        "reference_latency": reference_latency,
+        "candidate_latency": candidate_latency,
+        "speedup": reference_latency["mean_ms"] / max(candidate_latency["mean_ms"], 1e-9),
+        "disagreements": disagreements,
+    }
+
+
+def print_report(report):
+    print(f"对比图片：{report['images']} 张，其中两个模型均未检测到目标：{report['both_empty']} 张（不计入一致率）")
+    print(f"top-1 犬种一致率：{report['top1_agreement']:.2%}，平均置信度下降：{report['mean_confidence_drop']:.4f}")
+    for key, label in (("reference_latency", "FP32"), ("candidate_latency", "INT8")):
+        latency = report[key]
+        print(f"{label} 延迟：平均 {latency['mean_ms']:.1f} ms，P50 {latency['p50_ms']:.1f} ms，"
+              f"P95 {latency['p95_ms']:.1f} ms")
+    print(f"加速比：{report['speedup']:.2f}x")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="导出 ONNX / OpenVINO 模型并校验输出")
+    parser.add_argument("format", choices=("onnx", "openvino", "int8"), help="导出格式，int8 为量化的 ONNX 模型")
+    parser.add_argument("--model", default=MODEL_PATH, help="PyTorch 模型路径，默认读取 .env 中的 MODEL_PATH")
+    parser.add_argument("--imgsz", type=int, default=640, help="导出的输入尺寸")
+    parser.add_argument("--dynamic", action="store_true", help="导出动态输入尺寸（运行时可调整推理分辨率）")
+    parser.add_argument("--verify", nargs="*", default=[], help="用于校验输出一致性的图片、目录或通配符")
+    parser.add_argument("--atol", type=float, default=0.02, help="允许的置信度误差")
+    parser.add_argument("--mode", choices=("dynamic", "static"),
+                        help="INT8 量化方式，默认提供校准图片时使用 static，否则使用 dynamic")
+    parser.add_argument("--calib", nargs="*", default=[], help="静态量化使用的校准图片、目录或通配符")
+    parser.add_argument("--report", nargs="*", default=[], help="生成 FP32 与 INT8 对比报告使用的图片")
+    parser.add_argument("--report-output", help="把对比报告另存为 JSON 文件")
+    return parser.parse_args(argv)
+
+
+def main_int8(args):
+    fp32_path = export_model(args.model, "onnx", args.imgsz)
+    int8_path = os.path.splitext(fp32_path)[0] + "_int8.onnx"
+    calib_paths = list(iter_image_paths(args.calib))
+    mode = args.mode or ("static" if calib_paths else "dynamic")
+    quantize_model(fp32_path, int8_path, mode, calib_paths, args.imgsz)
+    print(f"量化完成：{int8_path}")
+    if not args.report:
+        return 0
+
+    report = compare_models(args.model, int8_path, list(iter_image_paths(args.report)), args.imgsz)
+    print_report(report)
+    if args.report_output:
+        with open(args.report_output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.format == "int8":
+        return main_int8(args)
+    exported_path = export_model(args.model, args.format, args.imgsz, args.dynamic)
+    print(f"导出完成：{exported_path}")
+    if not args.verify:
+        return 0
+
+    ok, problems = verify_export(args.model, exported_path, list(iter_image_paths(args.verify)),
+                                 imgsz=args.imgsz, atol=args.atol)
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    print("校验通过，导出模型输出与原模型一致" if ok else "校验失败，导出模型输出与原模型不一致")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,35 @@
+import bisect
+import datetime
+import functools
+import math
 import sys
-import sqlite3
+import threading
+import time
 import uuid
+from collections import OrderedDict, deque
 from dotenv import load_dotenv, set_key
 import cv2
-from PyQt6.QtGui import QPixmap, QImage
+from PyQt6.QtGui import QPixmap, QImage, QIcon, QPainter, QColor
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QGridLayout, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton,
-    QComboBox, QMessageBox, QTextEdit, QTableWidget, QTableWidgetItem, QHeaderView, QFileDialog, QSlider, QFrame
+    QComboBox, QMessageBox, QTextEdit, QTableWidget, QTableWidgetItem, QHeaderView, QFileDialog, QSlider, QFrame,
+    QListWidget, QListWidgetItem, QSizePolicy, QTableView, QCheckBox, QDateEdit
+)
+from PyQt6.QtCore import (
+    Qt, QTimer, QThread, QSize, pyqtSignal, QAbstractTableModel, QModelIndex, QDate, QDateTime, QTime
 )
-from PyQt6.QtCore import Qt, QTimer
-from ultralytics import YOLO
 import os
-from PIL import Image, ImageDraw, ImageFont
 import numpy as np
 
+from database import Database, open_result_cache_writer
+from model import (
+    BATCH_SIZE, OverlayRenderer, YOLOModel, analyze_video, find_video_detections, image_archiver, model_registry,
+    read_image, resolve_model_path, result_cache
+)
+
 # 加载 .env 文件
 load_dotenv()
 
-# 获取模型路径
-MODEL_PATH = os.getenv("MODEL_PATH", "./best.pt")
-
 # 全局样式表
 GLOBAL_STYLESHEET = """
     QWidget {
@@ -102,475 +112,697 @@ GLOBAL_STYLESHEET = """
 """
 
 
-# 数据库操作类
-class Database:
-    def __init__(self, db_name):
-        """初始化数据库连接并创建所有必要的表"""
-        try:
-            self.conn = sqlite3.connect(db_name)
-            self.cursor = self.conn.cursor()
-
-            # 创建用户表（仅限普通用户）
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user (
-                    UID TEXT PRIMARY KEY,
-                    UNAME TEXT,
-                    UIDENTITY TEXT,
-                    UPD TEXT,
-                    EMAIL TEXT
-                )
-            """)
-
-            # 创建管理员表
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS admin (
-                    AID TEXT PRIMARY KEY,
-                    ANAME TEXT,
-                    APD TEXT,
-                    EMAIL TEXT
-                )
-            """)
-
-            # 创建预测记录表
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS prediction (
-                    PREDICTID TEXT PRIMARY KEY,
-                    USERID TEXT,
-                    IMAGEPATH TEXT,
-                    RESULT TEXT,
-                    PREDICTTIME TEXT
-                )
-            """)
-
-            # 创建反馈表
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS serve (
-                    SERVEID TEXT PRIMARY KEY,
-                    USERID TEXT,
-                    FEEDBACK TEXT,
-                    SERVETIME TEXT,
-                    FINISH BOOLEAN
-                )
-            """)
-
-            # 创建公告表
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS notice (
-                    NOTICE TEXT,
-                    OPRATORID TEXT,
-                    TIME TEXT
-                )
-            """)
-
-            self.conn.commit()
-            print("数据库连接成功，所有表已创建")
-        except sqlite3.Error as e:
-            print("数据库连接或表创建失败：", e)
-
-    def get_all_predictions(self):
-        """获取所有预测记录"""
-        try:
-            self.cursor.execute("SELECT PREDICTID, USERID, IMAGEPATH, RESULT, PREDICTTIME FROM prediction")
-            return self.cursor.fetchall()
-        except sqlite3.Error as e:
-            print("获取预测记录失败：", e)
-            return []
-
-    def get_next_uid(self):
-        """获取下一个可用的用户ID，从1001开始自增"""
-        try:
-            self.cursor.execute("SELECT MAX(CAST(UID AS INTEGER)) FROM user")
-            max_uid = self.cursor.fetchone()[0]
-            if max_uid is None:
-                return "1001"  # 如果表为空，从1001开始
-            next_uid = int(max_uid) + 1
-            if next_uid < 1001:
-                return "1001"  # 确保最小ID为1001
-            return str(next_uid)
-        except sqlite3.Error as e:
-            print("获取下一个UID失败：", e)
-            return "1001"  # 默认返回1001以确保系统继续运行
-
-    def get_next_aid(self):
-        """获取下一个可用的管理员ID，从1001开始自增"""
-        try:
-            self.cursor.execute("SELECT MAX(CAST(AID AS INTEGER)) FROM admin")
-            max_aid = self.cursor.fetchone()[0]
-            if max_aid is None:
-                return "1001"  # 如果表为空，从1001开始
-            next_aid = int(max_aid) + 1
-            if next_aid < 1001:
-                return "1001"  # 确保最小ID为1001
-            return str(next_aid)
-        except sqlite3.Error as e:
-            print("获取下一个AID失败：", e)
-            return "1001"  # 默认返回1001以确保系统继续运行
-
-    def add_prediction(self, user_id, image_path, result):
-        """添加预测记录"""
-        try:
-            predict_id = str(uuid.uuid4())
-            self.cursor.execute(
-                "INSERT INTO prediction (PREDICTID, USERID, IMAGEPATH, RESULT, PREDICTTIME) VALUES (?, ?, ?, ?, datetime('now'))",
-                (predict_id, user_id, image_path, result)
-            )
-            self.conn.commit()
-            print("预测记录保存成功")
-        except sqlite3.Error as e:
-            print("预测记录保存失败：", e)
-
-    def get_user_count(self):
-        """获取用户和管理员总数"""
-        try:
-            self.cursor.execute("SELECT COUNT(*) FROM user")
-            user_count = self.cursor.fetchone()[0]
-            self.cursor.execute("SELECT COUNT(*) FROM admin")
-            admin_count = self.cursor.fetchone()[0]
-            return user_count + admin_count
-        except sqlite3.Error as e:
-            print("获取用户数量失败：", e)
-            return 0
-
-    def get_feedback_count(self):
-        """获取反馈总数"""
-        try:
-            self.cursor.execute("SELECT COUNT(*) FROM serve")
-            return self.cursor.fetchone()[0]
-        except sqlite3.Error as e:
-            print("获取反馈数量失败：", e)
-            return 0
-
-    def get_prediction_count(self):
-        """获取预测次数"""
-        try:
-            self.cursor.execute("SELECT COUNT(*) FROM prediction")
-            return self.cursor.fetchone()[0]
-        except sqlite3.Error as e:
-            print("获取预测次数失败：", e)
-            return 0
-
-    def get_latest_notice(self):
-        """获取最新公告"""
-        try:
-            self.cursor.execute("SELECT NOTICE FROM notice ORDER BY TIME DESC LIMIT 1")
-            return self.cursor.fetchone()
-        except sqlite3.Error as e:
-            print("获取最新公告失败：", e)
-            return None
-
-    def add_feedback(self, serve_id, user_id, feedback):
-        """添加用户反馈"""
-        try:
-            self.cursor.execute(
-                "INSERT INTO serve (SERVEID, USERID, FEEDBACK, SERVETIME, FINISH) VALUES (?, ?, ?, datetime('now'), ?)",
-                (serve_id, user_id, feedback, False))
-            self.conn.commit()
-            print("反馈提交成功")
-        except sqlite3.Error as e:
-            print("反馈提交失败：", e)
-
-    def update_feedback_status(self, serve_id):
-        """更新反馈状态为已处理"""
-        try:
-            self.cursor.execute("UPDATE serve SET FINISH = ? WHERE SERVEID = ?", (True, serve_id))
-            self.conn.commit()
-            print("反馈状态更新成功")
-        except sqlite3.Error as e:
-            print("反馈状态更新失败：", e)
-
-    def get_all_feedback(self):
-        """获取所有反馈记录"""
-        try:
-            self.cursor.execute("SELECT * FROM serve")
-            return self.cursor.fetchall()
-        except sqlite3.Error as e:
-            print("获取反馈失败：", e)
-            return []
-
-    def update_notice(self, notice, operator_id):
-        """更新公告内容"""
-        try:
-            self.cursor.execute("INSERT INTO notice (NOTICE, OPRATORID, TIME) VALUES (?, ?, datetime('now'))",
-                                (notice, operator_id))
-            self.conn.commit()
-            print("公告更新成功")
-        except sqlite3.Error as e:
-            print("公告更新失败：", e)
-
-    def add_user(self, name, identity, password, email):
-        """添加新用户（仅普通用户）"""
-        try:
-            uid = self.get_next_uid()
-            self.cursor.execute("INSERT INTO user (UID, UNAME, UIDENTITY, UPD, EMAIL) VALUES (?, ?, ?, ?, ?)",
-                                (uid, name, identity, password, email))
-            self.conn.commit()
-            print("用户添加成功")
-            return uid
-        except sqlite3.Error as e:
-            print("用户添加失败：", e)
-            return None
+# 有界帧队列：队列满时丢弃最旧的帧，保证推理线程总是处理最新画面
+class FrameQueue:
+    def __init__(self, maxsize=2, on_drop=None):
+        """初始化帧队列，on_drop 在丢弃未处理的帧时调用，用于归还帧占用的缓冲区"""
+        self._items = deque()
+        self._maxsize = maxsize
+        self._on_drop = on_drop
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        """放入一帧，队列已满时丢弃最旧的帧"""
+        with self._cond:
+            while len(self._items) >= self._maxsize:
+                self._drop(self._items.popleft())
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """取出一帧，超时或队列关闭时返回 None"""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            return self._items.popleft() if self._items else None
+
+    def clear(self):
+        """清空队列中尚未处理的帧"""
+        with self._cond:
+            while self._items:
+                self._drop(self._items.popleft())
 
-    def add_admin(self, name, password, email):
-        """添加新管理员"""
-        try:
-            aid = self.get_next_aid()
-            self.cursor.execute("INSERT INTO admin (AID, ANAME, APD, EMAIL) VALUES (?, ?, ?, ?)",
-                                (aid, name, password, email))
-            self.conn.commit()
-            print("管理员添加成功")
-            return aid
-        except sqlite3.Error as e:
-            print("管理员添加失败：", e)
-            return None
-
-    def get_user(self, uid):
-        """根据用户ID获取用户信息"""
-        try:
-            self.cursor.execute("SELECT UID, UNAME, UIDENTITY, UPD, EMAIL FROM user WHERE UID = ?", (uid,))
-            return self.cursor.fetchone()
-        except sqlite3.Error as e:
-            print("查询用户失败：", e)
-            return None
-
-    def get_admin(self, aid):
-        """根据管理员ID获取管理员信息"""
-        try:
-            self.cursor.execute("SELECT AID, ANAME, 'Administrator', APD, EMAIL FROM admin WHERE AID = ?", (aid,))
-            return self.cursor.fetchone()
-        except sqlite3.Error as e:
-            print("查询管理员失败：", e)
-            return None
-
-    def get_user_by_role_and_password(self, uid, name, identity, password):
-        """根据用户信息验证用户或管理员"""
-        try:
-            if identity == "Administrator":
-                self.cursor.execute(
-                    "SELECT AID, ANAME, 'Administrator', APD, EMAIL FROM admin WHERE AID = ? AND ANAME = ? AND APD = ?",
-                    (uid, name, password))
-            else:
-                self.cursor.execute(
-                    "SELECT UID, UNAME, UIDENTITY, UPD, EMAIL FROM user WHERE UID = ? AND UNAME = ? AND UIDENTITY = ? AND UPD = ?",
-                    (uid, name, identity, password))
-            return self.cursor.fetchone()
-        except sqlite3.Error as e:
-            print("查询用户失败：", e)
-            return None
-
-    def get_all_users(self):
-        """获取所有普通用户信息"""
-        try:
-            self.cursor.execute("SELECT UID, UNAME, UIDENTITY, UPD, EMAIL FROM user")
-            return self.cursor.fetchall()
-        except sqlite3.Error as e:
-            print("查询所有用户失败：", e)
-            return []
-
-    def get_all_admins(self):
-        """获取所有管理员信息"""
-        try:
-            self.cursor.execute("SELECT AID, ANAME, 'Administrator', APD, EMAIL FROM admin")
-            return self.cursor.fetchall()
-        except sqlite3.Error as e:
-            print("查询所有管理员失败：", e)
+    def close(self):
+        """关闭队列并唤醒等待的线程"""
+        with self._cond:
+            self._closed = True
+            while self._items:
+                self._drop(self._items.popleft())
+            self._cond.notify_all()
+
+    def _drop(self, item):
+        if self._on_drop is not None:
+            self._on_drop(item)
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+
+def build_keyframe_index(video_path, stop_event=None):
+    """只读取数据包、不解码，返回视频中所有关键帧的帧序号；OpenCV 不支持或 stop_event 被置位时返回空列表"""
+    has_key_frame = getattr(cv2, "CAP_PROP_LRF_HAS_KEY_FRAME", None)
+    if has_key_frame is None:
+        return []
+    capture = cv2.VideoCapture(video_path)
+    keyframes = []
+    try:
+        if not capture.set(cv2.CAP_PROP_FORMAT, -1):
             return []
-
-    def get_users_by_role(self, role):
-        """根据角色获取用户信息"""
-        try:
-            if role == "Administrator":
-                self.cursor.execute("SELECT AID, ANAME, 'Administrator', APD, EMAIL FROM admin")
+        frame_index = 0
+        while capture.grab():
+            if stop_event is not None and stop_event.is_set():
+                return []
+            if capture.get(has_key_frame):
+                keyframes.append(frame_index)
+            frame_index += 1
+    finally:
+        capture.release()
+    return keyframes
+
+
+# 视频预读解码线程：提前把帧解码到固定数量、预先分配的环形缓冲区中
+class FrameDecoder(QThread):
+    preview_ready = pyqtSignal(int, QImage)  # 拖动进度条时的低分辨率预览：帧序号、预览图
+
+    def __init__(self, video_path, capacity=8, preview_size=160, preview_cache_size=256):
+        """打开视频并按视频尺寸预分配环形缓冲区"""
+        super().__init__()
+        self.video_path = video_path
+        self.capture = cv2.VideoCapture(video_path)
+        self.total_frames = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS)
+        self.width = int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.capacity = capacity
+        self._buffers = np.empty((capacity, max(self.height, 1), max(self.width, 1), 3), dtype=np.uint8)
+        self._free = deque(range(capacity))
+        self._ready = deque()  # (缓冲区槽位, 帧序号)
+        self._refs = [0] * capacity  # 已交给调用方的槽位的引用计数，归零后才能重新解码
+        self._cond = threading.Condition()
+        self._running = True
+        self._seek_to = None
+        self._generation = 0
+        self._next_index = 0
+        self._eof = False
+        self.decode_fps = 0.0
+        # 关键帧索引在后台建立；跳转目标与当前位置在同一 GOP 内时向前解码，不必重新定位
+        self.keyframes = []
+        self._index_stop = threading.Event()
+        self._index_thread = None
+        self._position_valid = True
+        # 低分辨率预览帧 LRU：帧序号 -> 缩小后的帧，拖动进度条时直接显示；
+        # 正常播放时只缓存关键帧，跳转后解码的第一帧也会缓存
+        self.preview_size = preview_size
+        self.preview_cache_size = preview_cache_size
+        self._previews = OrderedDict()
+        self._preview_to = None
+        scale = min(1.0, preview_size / max(self.width, self.height, 1))
+        self._preview_shape = (max(1, int(self.width * scale)), max(1, int(self.height * scale)))
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    @property
+    def at_end(self):
+        """视频已解码到末尾且缓冲区中没有剩余帧"""
+        with self._cond:
+            return self._eof and not self._ready
+
+    def occupancy(self):
+        """返回缓冲区中已解码待取的帧数"""
+        with self._cond:
+            return len(self._ready)
+
+    def seek(self, frame_index):
+        """跳转到指定帧，丢弃已预读的帧，由解码线程执行实际的定位"""
+        with self._cond:
+            self._seek_to = frame_index
+            self._generation += 1
+            while self._ready:
+                self._free.append(self._ready.popleft()[0])
+            self._eof = False
+            self._cond.notify_all()
+
+    def keyframe_before(self, frame_index):
+        """返回不晚于 frame_index 的最近关键帧，没有关键帧索引时返回 frame_index 本身"""
+        keyframes = self.keyframes
+        position = bisect.bisect_right(keyframes, frame_index)
+        return keyframes[position - 1] if position else frame_index
+
+    def _is_keyframe(self, frame_index):
+        keyframes = self.keyframes
+        position = bisect.bisect_left(keyframes, frame_index)
+        return position < len(keyframes) and keyframes[position] == frame_index
+
+    def nearest_preview(self, frame_index):
+        """在预览缓存中查找与 frame_index 同一 GOP、且不晚于它的最近一帧，返回 (帧序号, 预览帧) 或 None"""
+        lower = self.keyframe_before(frame_index)
+        with self._cond:
+            candidates = [i for i in self._previews if lower <= i <= frame_index]
+            if not candidates:
+                return None
+            best = max(candidates)
+            self._previews.move_to_end(best)
+            return best, self._previews[best]
+
+    def request_preview(self, frame_index):
+        """请求解码线程生成 frame_index 所在 GOP 关键帧的预览，完成后发出 preview_ready"""
+        with self._cond:
+            self._preview_to = frame_index
+            self._cond.notify_all()
+
+    def _remember_preview(self, frame_index, frame):
+        preview = cv2.resize(frame, self._preview_shape, interpolation=cv2.INTER_NEAREST)
+        with self._cond:
+            self._previews[frame_index] = preview
+            self._previews.move_to_end(frame_index)
+            while len(self._previews) > self.preview_cache_size:
+                self._previews.popitem(last=False)
+        return preview
+
+    def _decode_preview(self, frame_index):
+        """定位到关键帧只解码一帧作为预览，之后恢复预读位置"""
+        keyframe = self.keyframe_before(frame_index)
+        self.capture.set(cv2.CAP_PROP_POS_FRAMES, keyframe)
+        self._position_valid = False
+        ret, frame = self.capture.read()
+        if not ret:
+            return
+        preview = np.ascontiguousarray(self._remember_preview(keyframe, frame))
+        height, width = preview.shape[:2]
+        q_img = QImage(preview.data, width, height, 3 * width, QImage.Format.Format_BGR888).copy()
+        self.preview_ready.emit(keyframe, q_img)
+
+    def _seek(self, frame_index):
+        """跳转到 frame_index：目标在当前位置之后且属于同一 GOP 时只向前跳过中间帧"""
+        if (self._position_valid and self.keyframes
+                and self.keyframe_before(frame_index) <= self._next_index <= frame_index):
+            for _ in range(frame_index - self._next_index):
+                self.capture.grab()
+        else:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+        self._next_index = frame_index
+        self._position_valid = True
+
+    def read(self, timeout=0):
+        """取出下一帧，返回 (帧序号, 槽位, 帧)；缓冲区暂无可用帧时返回 None
+
+        帧直接引用环形缓冲区，不复制；调用方用完后调用 release(槽位) 归还，
+        交给其他线程前调用 retain(槽位) 增加引用，在引用全部归还前解码线程不会覆盖该槽位。
+        """
+        with self._cond:
+            if not self._ready and timeout:
+                self._cond.wait_for(lambda: self._ready or self._eof or not self._running, timeout)
+            if not self._ready:
+                return None
+            slot, frame_index = self._ready.popleft()
+            self._refs[slot] = 1
+        return frame_index, slot, self._buffers[slot]
+
+    def retain(self, slot):
+        """增加槽位的引用"""
+        with self._cond:
+            self._refs[slot] += 1
+
+    def release(self, slot):
+        """归还一次槽位的引用，引用归零后槽位可以重新解码"""
+        with self._cond:
+            self._refs[slot] -= 1
+            if self._refs[slot] == 0:
+                self._free.append(slot)
+                self._cond.notify_all()
+
+    def stop(self):
+        """停止解码线程和关键帧扫描并释放视频文件"""
+        self._index_stop.set()
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self.wait()
+        if self._index_thread is not None:
+            self._index_thread.join()
+        self.capture.release()
+
+    def _index_keyframes(self):
+        self.keyframes = build_keyframe_index(self.video_path, self._index_stop)
+
+    def run(self):
+        self._index_thread = threading.Thread(target=self._index_keyframes, name="KeyframeIndex", daemon=True)
+        self._index_thread.start()
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: not self._running or self._seek_to is not None or self._preview_to is not None
+                    or (self._free and not self._eof))
+                if not self._running:
+                    return
+                seek_to, self._seek_to = self._seek_to, None
+                preview_to, self._preview_to = self._preview_to, None
+                generation = self._generation
+                slot = self._free.popleft() if self._free and preview_to is None else None
+
+            if preview_to is not None:
+                self._decode_preview(preview_to)
+            if seek_to is not None:
+                self._seek(seek_to)
+            elif not self._position_valid and slot is not None:
+                self._seek(self._next_index)
+            if slot is None:
+                continue
+
+            buffer = self._buffers[slot]
+            start = time.perf_counter()
+            ret, frame = self.capture.read(buffer)
+            if ret and frame is not None and frame.ctypes.data != buffer.ctypes.data:
+                # 个别视频的帧尺寸与容器声明不一致，缩放到缓冲区尺寸
+                cv2.resize(frame, (buffer.shape[1], buffer.shape[0]), dst=buffer)
+
+            with self._cond:
+                if generation != self._generation:
+                    # 解码期间发生了跳转，这一帧已过期
+                    self._free.append(slot)
+                    continue
+                if not ret:
+                    self._free.append(slot)
+                    self._eof = True
+                else:
+                    self._ready.append((slot, self._next_index))
+                    self._next_index += 1
+                self._cond.notify_all()
+            if ret and (seek_to is not None or self._is_keyframe(self._next_index - 1)):
+                self._remember_preview(self._next_index - 1, buffer)
+
+            if ret:
+                # 按单帧解码耗时计算解码能力，不受缓冲区已满时的等待影响
+                instant_fps = 1.0 / max(time.perf_counter() - start, 1e-6)
+                self.decode_fps = instant_fps if self.decode_fps == 0 else 0.9 * self.decode_fps + 0.1 * instant_fps
+
+
+# 检测步长控制：根据推理耗时和帧间隔决定每隔几帧运行一次检测器
+class StrideController:
+    def __init__(self, max_stride=8, smoothing=0.2):
+        """初始化步长控制器"""
+        self.max_stride = max_stride
+        self.smoothing = smoothing
+        self.stride = 1
+        self.latency_ms = 0.0
+
+    def update(self, latency_ms, budget_ms):
+        """记录一次推理耗时并更新步长，使平均每帧的检测开销不超过帧间隔"""
+        if self.latency_ms == 0:
+            self.latency_ms = latency_ms
+        else:
+            self.latency_ms += self.smoothing * (latency_ms - self.latency_ms)
+        target = math.ceil(self.latency_ms / max(budget_ms, 1))
+        self.stride = max(1, min(self.max_stride, target))
+        return self.stride
+
+    def reset(self):
+        self.stride = 1
+        self.latency_ms = 0.0
+
+
+# 推理分辨率控制：按最近若干帧的推理耗时在几档输入尺寸之间切换，带滞回避免来回抖动
+class ResolutionController:
+    def __init__(self, sizes=(320, 416, 512, 640), window=15, patience=3, low_ratio=0.6, high_ratio=1.0):
+        """初始化分辨率控制器，初始使用最大尺寸"""
+        self.sizes = sorted(sizes)
+        self.window = window
+        self.patience = patience
+        self.low_ratio = low_ratio
+        self.high_ratio = high_ratio
+        self.reset()
+
+    @property
+    def imgsz(self):
+        return self.sizes[self.level]
+
+    def reset(self):
+        self.level = len(self.sizes) - 1
+        self.latency_ms = 0.0
+        self._timings = deque(maxlen=self.window)
+        self._over = 0
+        self._under = 0
+
+    def update(self, latency_ms, budget_ms):
+        """记录一帧的推理耗时，必要时切换分辨率，返回当前输入尺寸
+
+        滚动中位数连续 patience 次超出预算时降一档；连续 patience 次低于预算的 low_ratio，
+        且按面积估算升档后仍不超预算时升一档。切换后清空窗口，重新积累计时。
+        """
+        self._timings.append(latency_ms)
+        self.latency_ms = float(np.median(self._timings))
+        if len(self._timings) < min(self.window, 5):
+            return self.imgsz
+
+        if self.latency_ms > budget_ms * self.high_ratio and self.level > 0:
+            self._over += 1
+            self._under = 0
+            if self._over >= self.patience:
+                self._switch(self.level - 1)
+        elif self.latency_ms < budget_ms * self.low_ratio and self.level < len(self.sizes) - 1:
+            self._under += 1
+            self._over = 0
+            scale = (self.sizes[self.level + 1] / self.imgsz) ** 2
+            if self._under >= self.patience and self.latency_ms * scale < budget_ms * self.high_ratio:
+                self._switch(self.level + 1)
+        else:
+            self._over = self._under = 0
+        return self.imgsz
+
+    def _switch(self, level):
+        self.level = level
+        self._timings.clear()
+        self._over = self._under = 0
+
+
+# 检测框外推：在两次检测之间按各跟踪目标的运动速度推算检测框位置
+class BoxPropagator:
+    def __init__(self):
+        """初始化外推状态"""
+        self.reset()
+
+    def reset(self):
+        self._frame_index = None
+        self._tracks = []  # (跟踪ID, 检测框, 每帧位移, 标签)
+        self._history = {}  # 跟踪ID -> (帧序号, 检测框)
+
+    def update(self, frame_index, detections, track_ids):
+        """用检测器的最新结果更新各目标的位置和速度"""
+        if self._frame_index is not None and frame_index < self._frame_index:
+            self._history.clear()  # 向后跳转后旧的速度不再可信
+        tracks = []
+        history = {}
+        for (x1, y1, x2, y2, label), track_id in zip(detections, track_ids):
+            box = np.array((x1, y1, x2, y2), dtype=np.float32)
+            velocity = np.zeros(4, dtype=np.float32)
+            previous = self._history.get(track_id) if track_id is not None else None
+            if previous is not None and frame_index > previous[0]:
+                velocity = (box - previous[1]) / (frame_index - previous[0])
+            tracks.append((track_id, box, velocity, label))
+            if track_id is not None:
+                history[track_id] = (frame_index, box)
+        self._frame_index = frame_index
+        self._tracks = tracks
+        self._history = history
+
+    def can_propagate(self, frame_index, stride):
+        """距离上次检测不足 stride 帧且向前播放时，可以用外推代替检测"""
+        return (self._frame_index is not None
+                and 0 < frame_index - self._frame_index < stride)
+
+    def predict(self, frame_index):
+        """外推指定帧的检测框"""
+        elapsed = frame_index - self._frame_index
+        detections = []
+        for _, box, velocity, label in self._tracks:
+            x1, y1, x2, y2 = (box + velocity * elapsed).astype(int)
+            detections.append((x1, y1, x2, y2, label))
+        return detections
+
+
+# 显示缓冲区：按画面区域尺寸预分配少量 BGR 缓冲区，QImage 直接引用其内存，界面线程取用后归还
+# 界面线程来不及显示时回收最旧的待显示画面，总是显示最新一帧
+class DisplayBuffers:
+    def __init__(self, count=3):
+        """初始化缓冲区槽位，缓冲区在首次使用或显示尺寸变化时分配"""
+        self._lock = threading.Lock()
+        self._buffers = [None] * count
+        self._free = deque(range(count))
+        self._pending = deque()  # 已交给界面线程、尚未取用的槽位，按先后排列
+        self._tickets = [0] * count  # 每次分配槽位时递增，界面线程据此判断画面是否已被回收
+        self.dropped = 0
+
+    def acquire(self, frame_shape, display_size):
+        """返回 (槽位, 票号, 缓冲区, 缩放比例)，缓冲区按比例缩放后恰好放入 display_size
+
+        没有空闲槽位时回收最旧的待显示画面，被回收的画面在界面线程中 claim 失败、不再显示；
+        界面线程正在取用所有槽位时返回 None。
+        """
+        height, width = frame_shape[:2]
+        display_width, display_height = display_size
+        scale = min(display_width / width, display_height / height)
+        target = (max(1, int(height * scale)), max(1, int(width * scale)), 3)
+        with self._lock:
+            if self._free:
+                slot = self._free.popleft()
+            elif self._pending:
+                slot = self._pending.popleft()
+                self.dropped += 1
             else:
-                self.cursor.execute("SELECT UID, UNAME, UIDENTITY, UPD, EMAIL FROM user WHERE UIDENTITY = ?", (role,))
-            return self.cursor.fetchall()
-        except sqlite3.Error as e:
-            print(f"查询{role}用户失败：", e)
-            return []
-
-    def update_user(self, uid, name, identity, password, email):
-        """更新用户信息"""
-        try:
-            self.cursor.execute("UPDATE user SET UNAME = ?, UIDENTITY = ?, UPD = ?, EMAIL = ? WHERE UID = ?",
-                                (name, identity, password, email, uid))
-            self.conn.commit()
-            print("用户信息更新成功")
-        except sqlite3.Error as e:
-            print("用户信息更新失败：", e)
-
-    def update_admin(self, aid, name, password, email):
-        """更新管理员信息"""
+                return None
+            self._tickets[slot] += 1
+            ticket = self._tickets[slot]
+            self._pending.append(slot)
+        buffer = self._buffers[slot]
+        if buffer is None or buffer.shape != target:
+            buffer = self._buffers[slot] = np.empty(target, dtype=np.uint8)
+        return slot, ticket, buffer, scale
+
+    def claim(self, slot, ticket):
+        """界面线程取用画面前调用；画面已被更新的画面回收时返回 False，此时不要显示也不要归还"""
+        with self._lock:
+            if self._tickets[slot] != ticket or slot not in self._pending:
+                return False
+            self._pending.remove(slot)
+            return True
+
+    def release(self, slot):
+        """界面线程不再引用该缓冲区后归还槽位"""
+        with self._lock:
+            self._free.append(slot)
+
+
+# 视频推理线程：在后台完成跟踪推理和叠加绘制，通过信号把结果交给界面线程
+class InferenceWorker(QThread):
+    # 渲染后的画面、检测结果文本（空串表示不更新）、帧序号、显示缓冲区槽位和票号（见 claim_buffer、release_buffer）
+    frame_ready = pyqtSignal(QImage, str, int, int, int)
+
+    def __init__(self, model, frame_queue):
+        """初始化推理线程"""
+        super().__init__()
+        self.model = model
+        self.frame_queue = frame_queue
+        self.infer_fps = 0.0
+        self.infer_ms = 0.0
+        self.renderer = OverlayRenderer()
+        # 画面在推理线程中缩放到画面区域的尺寸，界面线程只处理显示尺寸的数据
+        self.display_size = (400, 400)
+        self.display_buffers = DisplayBuffers()
+        # 自适应步长：按推理耗时与帧间隔自动调整检测间隔
+        self.adaptive = False
+        self.frame_budget_ms = 33
+        self.stride_controller = StrideController()
+        # 动态分辨率：按推理耗时在 320~640 之间选择输入尺寸
+        self.dynamic_resolution = False
+        self.resolution_controller = ResolutionController()
+        self.propagator = BoxPropagator()
+        # 当前视频的离线分析结果，存在时直接绘制缓存的检测框，不再运行模型
+        self.video_detections = None
+        self._last_result_text = ""
+        self._running = True
+        self._reset_requested = False
+
+    def set_model(self, model):
+        """切换推理使用的模型"""
+        self.model = model
+        self.video_detections = None
+        self._reset_requested = True
+
+    def request_reset(self):
+        """请求在推理线程中清除跟踪状态，并丢弃尚未处理的帧"""
+        self.frame_queue.clear()
+        self._reset_requested = True
+
+    def claim_buffer(self, slot, ticket):
+        """界面线程显示画面前确认显示缓冲区未被更新的画面回收"""
+        return self.display_buffers.claim(slot, ticket)
+
+    def release_buffer(self, slot):
+        """界面线程显示完画面后归还显示缓冲区"""
+        self.display_buffers.release(slot)
+
+    def stop(self):
+        """停止线程并等待其退出"""
+        self._running = False
+        self.frame_queue.close()
+        self.wait()
+
+    def run(self):
+        last_emit = None
+        while self._running:
+            if self._reset_requested:
+                self._reset_requested = False
+                self.model.reset_model()
+                self.propagator.reset()
+                self.stride_controller.reset()
+                self.resolution_controller.reset()
+
+            job = self.frame_queue.get(timeout=0.1)
+            if job is None:
+                continue
+            frame, frame_index, tracking, release = job
+            try:
+                detections = []
+                result_text = ""
+                video_detections = self.video_detections
+                if tracking and video_detections is not None:
+                    detections, _, result_text = video_detections.frame(frame_index)
+                elif tracking:
+                    detections, result_text = self._track(frame, frame_index)
+
+                acquired = self.display_buffers.acquire(frame.shape, self.display_size)
+                if acquired is None:
+                    continue  # 界面线程正在取用所有显示缓冲区
+                slot, ticket, canvas, scale = acquired
+                height, width = canvas.shape[:2]
+                # 直接缩放到预分配的显示缓冲区，检测框按同一比例换算后画在缩放后的画面上，原始帧保持不变
+                interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+                cv2.resize(frame, (width, height), dst=canvas, interpolation=interpolation)
+            finally:
+                # 解码缓冲区中的帧只读到这里，之后归还给解码线程
+                release()
+            if detections:
+                self.renderer.draw(canvas, [(x1 * scale, y1 * scale, x2 * scale, y2 * scale, label)
+                                            for x1, y1, x2, y2, label in detections])
+            # QImage 不复制像素，直接引用显示缓冲区；槽位在界面线程调用 release_buffer 之前不会被复用
+            q_img = QImage(canvas.data, width, height, 3 * width, QImage.Format.Format_BGR888)
+            self.frame_ready.emit(q_img, result_text, frame_index, slot, ticket)
+
+            now = time.perf_counter()
+            if last_emit is not None:
+                instant_fps = 1.0 / max(now - last_emit, 1e-6)
+                self.infer_fps = instant_fps if self.infer_fps == 0 else 0.9 * self.infer_fps + 0.1 * instant_fps
+            last_emit = now
+
+    def _track(self, frame, frame_index):
+        """返回当前帧的检测框和结果文本
+
+        自适应模式下每隔 stride 帧运行一次检测器，中间帧按各跟踪目标的速度外推检测框。
+        """
+        if self.adaptive and self.propagator.can_propagate(frame_index, self.stride_controller.stride):
+            return self.propagator.predict(frame_index), self._last_result_text
+
+        imgsz = self.resolution_controller.imgsz if self.dynamic_resolution else None
+        start = time.perf_counter()
+        results = self.model.track(frame, imgsz=imgsz)
+        self.infer_ms = (time.perf_counter() - start) * 1000
+        if self.dynamic_resolution:
+            self.resolution_controller.update(self.infer_ms, self.frame_budget_ms)
+        self.stride_controller.update(self.infer_ms, self.frame_budget_ms)
+
+        detections, track_ids, result_text = self._extract_detections(results)
+        self.propagator.update(frame_index, detections, track_ids)
+        self._last_result_text = result_text
+        return detections, result_text
+
+    def _extract_detections(self, results):
+        """从跟踪结果中提取检测框、跟踪ID和结果文本"""
+        if len(results) == 0 or len(results[0].boxes) == 0:
+            return [], [], "未检测到目标"
+
+        boxes = results[0].boxes
+        xyxy = boxes.xyxy.cpu().numpy().astype(int)
+        class_ids = boxes.cls.cpu().numpy().astype(int)
+        confidences = boxes.conf.cpu().numpy()
+        track_ids = boxes.id.cpu().numpy().astype(int).tolist() if boxes.id is not None else [None] * len(xyxy)
+
+        detections = []
+        detected_objects = []
+        for (x1, y1, x2, y2), class_id, confidence in zip(xyxy, class_ids, confidences):
+            class_name = self.model.model.names[class_id]
+            chinese_class_name = self.model.class_name_map.get(class_name, class_name)
+            detections.append((x1, y1, x2, y2, f"{class_name} {confidence:.2f}"))
+            detected_objects.append(f"{chinese_class_name} ({confidence:.2f})")
+
+        return detections, track_ids, "检测到: " + ", ".join(detected_objects)
+
+
+# 视频分析线程：单独加载一份模型，不按播放节奏跟踪整段视频并保存每帧的检测结果
+class VideoAnalysisWorker(QThread):
+    progress = pyqtSignal(int, int)  # 已处理帧数、总帧数
+
+    def __init__(self, model_path, backend, video_path):
+        """初始化视频分析线程"""
+        super().__init__()
+        self.model_path = model_path
+        self.backend = backend
+        self.video_path = video_path
+        self.detections = None
+        self.error = None
+        self.elapsed = 0.0
+        self._running = True
+
+    def request_stop(self):
+        """请求停止，不等待；当前批次结束后线程退出并发出 finished"""
+        self._running = False
+
+    def stop(self):
+        """请求停止并等待当前批次结束"""
+        self.request_stop()
+        self.wait()
+
+    def run(self):
+        start = time.perf_counter()
         try:
-            self.cursor.execute("UPDATE admin SET ANAME = ?, APD = ?, EMAIL = ? WHERE AID = ?",
-                                (name, password, email, aid))
-            self.conn.commit()
-            print("管理员信息更新成功")
-        except sqlite3.Error as e:
-            print("管理员信息更新失败：", e)
+            # 独立的模型实例拥有自己的跟踪器，不会打乱界面上实时跟踪的状态
+            model = YOLOModel(self.model_path, backend=self.backend, shared=False)
+            self.detections = analyze_video(model, self.video_path, progress=self.progress.emit,
+                                            should_stop=lambda: not self._running)
+        except Exception as e:
+            self.error = str(e)
+        self.elapsed = time.perf_counter() - start
 
-    def close(self):
-        """关闭数据库连接"""
-        self.conn.close()
-        print("数据库连接关闭")
 
+# 批量识别线程：逐批推理，每张图片的结果通过信号实时送到界面
+class BatchPredictWorker(QThread):
+    result_ready = pyqtSignal(str, str, float, QImage)  # 图片路径、中文类别名（空串表示未检测到）、置信度、缩略图
+    progress = pyqtSignal(int, int)  # 已完成数量、总数
 
-# YOLOv11 模型类（未修改）
-class YOLOModel:
-    def __init__(self, model_path):
-        """初始化YOLO模型"""
-        self.model_path = model_path
-        self.model = YOLO(model_path)
-        self.class_name_map = {
-            "Chihuahua": "吉娃娃",
-            "Japanese_spaniel": "日本猎犬",
-            "Maltese_dog": "马尔济斯犬",
-            "Pekinese": "北京犬",
-            "Shih-Tzu": "西施犬",
-            "Blenheim_spaniel": "布伦海姆西班牙猎犬",
-            "papillon": "蝴蝶犬",
-            "toy_terrier": "玩具梗犬",
-            "Rhodesian_ridgeback": "罗得西亚背脊犬",
-            "Afghan_hound": "阿富汗猎犬",
-            "basset": "巴吉度猎犬",
-            "beagle": "比格犬",
-            "bloodhound": "寻血猎犬",
-            "bluetick": "蓝蒂克猎犬",
-            "black-and-tan_coonhound": "黑棕浣熊猎犬",
-            "Walker_hound": "沃克猎犬",
-            "English_foxhound": "英国猎狐犬",
-            "redbone": "红骨猎犬",
-            "borzoi": "波索尔猎犬",
-            "Irish_wolfhound": "爱尔兰狼犬",
-            "Italian_greyhound": "意大利灰狗",
-            "whippet": "惠比特犬",
-            "Ibizan_hound": "伊比莎猎犬",
-            "Norwegian_elkhound": "挪威猎犬",
-            "otterhound": "水獭猎犬",
-            "Saluki": "萨路基犬",
-            "Scottish_deerhound": "苏格兰鹿犬",
-            "Weimaraner": "魏玛犬",
-            "Staffordshire_bullterrier": "斯塔福郡斗牛梗",
-            "American_Staffordshire_terrier": "美国斯塔福郡梗",
-            "Bedlington_terrier": "贝灵顿梗",
-            "Border_terrier": "边境梗",
-            "Kerry_blue_terrier": "凯利蓝梗",
-            "Irish_terrier": "爱尔兰梗",
-            "Norfolk_terrier": "诺福克梗",
-            "Norwich_terrier": "诺维奇梗",
-            "Yorkshire_terrier": "约克夏梗",
-            "wire-haired_fox_terrier": "刚毛狐梗",
-            "Lakeland_terrier": "莱克兰梗",
-            "Sealyham_terrier": "西利哈姆梗",
-            "Airedale": "艾尔代尔梗",
-            "cairn": "凯恩梗",
-            "Australian_terrier": "澳大利亚梗",
-            "Dandie_Dinmont": "丹迪丁蒙梗",
-            "Boston_bull": "波士顿斗牛犬",
-            "miniature_schnauzer": "迷你雪纳瑞",
-            "giant_schnauzer": "巨型雪纳瑞",
-            "standard_schnauzer": "标准雪纳瑞",
-            "Scotch_terrier": "苏格兰梗",
-            "Tibetan_terrier": "西藏梗",
-            "silky_terrier": "丝毛梗",
-            "soft-coated_wheaten_terrier": "软毛麦色梗",
-            "West_Highland_white_terrier": "西高地白梗",
-            "Lhasa": "拉萨犬",
-            "flat-coated_retriever": "平毛寻回犬",
-            "curly-coated_retriever": "卷毛寻回犬",
-            "golden_retriever": "金毛寻回犬",
-            "Labrador_retriever": "拉布拉多寻回犬",
-            "Chesapeake_Bay_retriever": "切萨皮克湾寻回犬",
-            "German_short-haired_pointer": "德国短毛指示犬",
-            "vizsla": "维兹拉犬",
-            "English_setter": "英国塞特犬",
-            "Irish_setter": "爱尔兰塞特犬",
-            "Gordon_setter": "戈登塞特犬",
-            "Brittany_spaniel": "布列塔尼猎犬",
-            "clumber": "克拉姆猎犬",
-            "English_springer": "英国史宾格犬",
-            "Welsh_springer_spaniel": "威尔士史宾格犬",
-            "cocker_spaniel": "可卡犬",
-            "Sussex_spaniel": "苏塞克斯猎犬",
-            "Irish_water_spaniel": "爱尔兰水猎犬",
-            "kuvasz": "库瓦斯犬",
-            "schipperke": "斯希珀基犬",
-            "groenendael": "格罗宁达尔犬",
-            "malinois": "马里努阿犬",
-            "briard": "布里亚德犬",
-            "kelpie": "凯尔皮犬",
-            "komondor": "科蒙多犬",
-            "Old_English_sheepdog": "古老英国牧羊犬",
-            "Shetland_sheepdog": "设得兰牧羊犬",
-            "collie": "柯利犬",
-            "Border_collie": "边境柯利犬",
-            "Bouvier_des_Flandres": "弗兰德斯牧牛犬",
-            "Rottweiler": "罗威纳犬",
-            "German_shepherd": "德国牧羊犬",
-            "Doberman": "杜宾犬",
-            "miniature_pinscher": "迷你杜宾犬",
-            "Greater_Swiss_Mountain_dog": "大瑞士山地犬",
-            "Bernese_mountain_dog": "伯恩山犬",
-            "Appenzeller": "阿彭策尔山犬",
-            "EntleBucher": "恩特布赫山犬",
-            "boxer": "拳师犬",
-            "bull_mastiff": "斗牛獒",
-            "Tibetan_mastiff": "藏獒",
-            "French_bulldog": "法国斗牛犬",
-            "Great_Dane": "大丹犬",
-            "Saint_Bernard": "圣伯纳犬",
-            "Eskimo_dog": "爱斯基摩犬",
-            "malamute": "马拉缪犬",
-            "Siberian_husky": "西伯利亚哈士奇",
-            "affenpinscher": "阿芬犬",
-            "basenji": "巴辛吉犬",
-            "pug": "巴哥犬",
-            "Leonberg": "莱昂伯格犬",
-            "Newfoundland": "纽芬兰犬",
-            "Great_Pyrenees": "大白熊犬",
-            "Samoyed": "萨摩耶犬",
-            "Pomeranian": "博美犬",
-            "chow": "松狮犬",
-            "keeshond": "荷兰毛狮犬",
-            "Brabancon_griffon": "布拉邦松格里芬犬",
-            "Pembroke": "彭布罗克威尔士柯基",
-            "Cardigan": "卡迪根威尔士柯基",
-            "toy_poodle": "玩具贵宾犬",
-            "miniature_poodle": "迷你贵宾犬",
-            "standard_poodle": "标准贵宾犬",
-            "Mexican_hairless": "墨西哥无毛犬",
-            "dingo": "澳洲野犬",
-            "dhole": "亚洲野犬",
-            "African_hunting_dog": "非洲猎犬"
-        }
-        print("模型类别名称：", self.model.names)
-        self._is_tracking = False
-
-    def predict(self, image_path):
-        """对图片进行预测，确保禁用跟踪"""
-        self.reset_model()
-        results = self.model.predict(source=image_path, conf=0.1, save=True, show=False, stream=False)
-        if len(results) > 0:
-            boxes = results[0].boxes
-            if len(boxes) > 0:
-                class_id = int(boxes.cls[0])
-                confidence = float(boxes.conf[0])
-                class_name = results[0].names[class_id]
-                chinese_class_name = self.class_name_map.get(class_name, class_name)
-                print(f"检测到目标：{chinese_class_name}, 置信度：{confidence}")
-                return chinese_class_name, confidence, results[0].save_dir
-        print("未检测到目标")
-        return None, None, None
-
-    def track(self, frame):
-        """对视频帧进行跟踪"""
-        results = self.model.track(source=frame, conf=0.1, persist=True, stream=False)
-        return results
-
-    def reset_model(self):
-        """重置模型以清除所有跟踪状态"""
-        self.model = YOLO(self.model_path)
-        if hasattr(self.model, 'trackers'):
-            self.model.trackers = None
-        print("模型状态已重置")
+    def __init__(self, model, image_paths, batch_size=BATCH_SIZE, thumbnail_size=160):
+        """初始化批量识别线程"""
+        super().__init__()
+        self.model = model
+        self.image_paths = image_paths
+        self.batch_size = batch_size
+        self.thumbnail_size = thumbnail_size
+        self.elapsed = 0.0
+        self._running = True
+
+    def stop(self):
+        """请求停止并等待当前批次结束"""
+        self._running = False
+        self.wait()
+
+    def run(self):
+        start = time.perf_counter()
+        total = len(self.image_paths)
+        for done, (path, class_name, confidence, annotated) in enumerate(
+                self.model.predict_batch(self.image_paths, self.batch_size), start=1):
+            if not self._running:
+                break
+            image_archiver.submit(annotated, path)
+            self.result_ready.emit(path, class_name or "", confidence or 0.0, self._thumbnail(annotated, path))
+            self.progress.emit(done, total)
+        self.elapsed = time.perf_counter() - start
+
+    def _thumbnail(self, annotated, path):
+        """生成缩略图，未检测到目标时使用原图"""
+        frame = annotated if annotated is not None else read_image(path)
+        if frame is None:
+            return QImage()
+        height, width = frame.shape[:2]
+        scale = self.thumbnail_size / max(height, width)
+        if scale < 1:
+            frame = cv2.resize(frame, (max(1, int(width * scale)), max(1, int(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+        frame = np.ascontiguousarray(frame)
+        height, width = frame.shape[:2]
+        return QImage(frame.data, width, height, 3 * width, QImage.Format.Format_BGR888).copy()
 
 
 # 登录页面
@@ -900,7 +1132,7 @@ class HandleFeedbackPage(QWidget):
         self.load_feedback_table()
 
 
-# 主页（未修改）
+# 主页
 class HomePage(QWidget):
     def __init__(self, main_window):
         """初始化主页"""
@@ -917,8 +1149,9 @@ class HomePage(QWidget):
         notice_layout = QVBoxLayout()
         notice_frame.setLayout(notice_layout)
 
-        latest_notice = self.main_window.db.get_latest_notice()
-        notice_text = latest_notice[0] if latest_notice else "暂无公告"
+        # 统计数据由触发器维护，主页只需一次主键查询
+        stats = self.main_window.db.get_home_stats()
+        notice_text = stats["latest_notice"] or "暂无公告"
         self.notice_label = QLabel(f"{notice_text}")
         self.notice_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         notice_layout.addWidget(self.notice_label)
@@ -934,7 +1167,7 @@ class HomePage(QWidget):
         user_card.setLayout(user_layout)
         user_label = QLabel("用户数量")
         user_label.setStyleSheet("font-size: 20px; font-weight: bold;")
-        user_count = QLabel(str(self.main_window.db.get_user_count()))
+        user_count = QLabel(str(stats["user_count"]))
         user_count.setStyleSheet("font-size: 28px; color: #000000;")
         user_layout.addWidget(user_label)
         user_layout.addWidget(user_count)
@@ -945,7 +1178,7 @@ class HomePage(QWidget):
         feedback_card.setLayout(feedback_layout)
         feedback_label = QLabel("反馈数量")
         feedback_label.setStyleSheet("font-size: 20px; font-weight: bold;")
-        feedback_count = QLabel(str(self.main_window.db.get_feedback_count()))
+        feedback_count = QLabel(str(stats["feedback_count"]))
         feedback_count.setStyleSheet("font-size: 28px; color: #000000;")
         feedback_layout.addWidget(feedback_label)
         feedback_layout.addWidget(feedback_count)
@@ -956,7 +1189,7 @@ class HomePage(QWidget):
         predict_card.setLayout(predict_layout)
         predict_label = QLabel("预测次数")
         predict_label.setStyleSheet("font-size: 20px; font-weight: bold;")
-        predict_count = QLabel(str(self.main_window.db.get_prediction_count()))
+        predict_count = QLabel(str(stats["prediction_count"]))
         predict_count.setStyleSheet("font-size: 28px; color: #000000;")
         predict_layout.addWidget(predict_label)
         predict_layout.addWidget(predict_count)
@@ -1008,6 +1241,11 @@ class HomePage(QWidget):
             self.prediction_record_button.clicked.connect(self.on_prediction_record)
             button_layout.addWidget(self.prediction_record_button, 3, 0)
 
+        if self.main_window.current_user[2] == "Administrator":
+            self.analytics_button = QPushButton("数据分析")
+            self.analytics_button.clicked.connect(self.on_analytics)
+            button_layout.addWidget(self.analytics_button, 4, 0)
+
         main_layout.addWidget(button_frame)
 
         contact_frame = QFrame()
@@ -1024,9 +1262,12 @@ class HomePage(QWidget):
 
     def on_upload_model(self):
         """上传模型文件"""
-        file_path, _ = QFileDialog.getOpenFileName(self, "选择模型文件", "", "模型文件 (*.pt)")
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "选择模型文件", "", "模型文件 (*.pt *.onnx);;OpenVINO 模型 (*.xml)")
         if file_path:
+            model_registry.evict(resolve_model_path(os.getenv("MODEL_PATH", "./best.pt"))[0])
             set_key(".env", "MODEL_PATH", file_path)
+            os.environ["MODEL_PATH"] = file_path
             QMessageBox.information(self, "上传成功", "模型文件已上传并更新！")
 
     def on_view_feedback(self):
@@ -1039,6 +1280,11 @@ class HomePage(QWidget):
         self.prediction_record_page = PredictionRecordPage(self.main_window)
         self.main_window.setCentralWidget(self.prediction_record_page)
 
+    def on_analytics(self):
+        """查看犬种和用户的预测统计"""
+        self.analytics_page = AnalyticsPage(self.main_window)
+        self.main_window.setCentralWidget(self.analytics_page)
+
     def on_logout(self):
         """退出登录"""
         self.main_window.current_user = None
@@ -1098,15 +1344,11 @@ class ViewFeedbackPage(QWidget):
     def load_feedback_table(self):
         """加载用户反馈表格"""
         user_id = self.main_window.current_user[0]
-        try:
-            self.main_window.db.cursor.execute("SELECT * FROM serve WHERE USERID = ?", (user_id,))
-            feedbacks = self.main_window.db.cursor.fetchall()
-            self.feedback_table.setRowCount(len(feedbacks))
-            for i, feedback in enumerate(feedbacks):
-                for j, item in enumerate(feedback):
-                    self.feedback_table.setItem(i, j, QTableWidgetItem(str(item)))
-        except sqlite3.Error as e:
-            print("加载反馈记录失败：", e)
+        feedbacks = self.main_window.db.get_feedback_by_user(user_id)
+        self.feedback_table.setRowCount(len(feedbacks))
+        for i, feedback in enumerate(feedbacks):
+            for j, item in enumerate(feedback):
+                self.feedback_table.setItem(i, j, QTableWidgetItem(str(item)))
 
     def on_back(self):
         """返回主页"""
@@ -1114,7 +1356,73 @@ class ViewFeedbackPage(QWidget):
         self.close()
 
 
-# 预测记录页面（未修改）
+# 预测记录表格模型：滚动到底部时才按键集分页从数据库取下一页，筛选和排序都在 SQL 中完成
+class PredictionTableModel(QAbstractTableModel):
+    HEADERS = ["预测ID", "用户ID", "图片路径", "预测结果", "预测时间"]
+
+    def __init__(self, db, page_size=200):
+        """初始化模型，调用 refresh 后加载第一页"""
+        super().__init__()
+        self.db = db
+        self.page_size = page_size
+        self.total = 0
+        self.sort = "rowid"
+        self.descending = False
+        self.filters = {}
+        self._rows = []  # (rowid, 预测ID, 用户ID, 图片路径, 预测结果, 预测时间)
+        self._exhausted = True
+
+    def set_query(self, sort="rowid", descending=False, **filters):
+        """设置排序方式（database.PREDICTION_SORTS 中的键）和筛选条件，并重新加载"""
+        self.sort = sort
+        self.descending = descending
+        self.filters = {key: value for key, value in filters.items() if value}
+        self.refresh()
+
+    def refresh(self):
+        """丢弃已加载的行，重新统计总数并加载第一页"""
+        self.beginResetModel()
+        self._rows = []
+        self._exhausted = False
+        self.total = self.db.count_predictions(**self.filters)
+        self.endResetModel()
+        self.fetchMore(QModelIndex())
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        return str(self._rows[index.row()][index.column() + 1])
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        """从上一页最后一行之后取下一页"""
+        if parent.isValid() or self._exhausted:
+            return
+        after = self._rows[-1] if self._rows else None
+        page = self.db.get_predictions_page(after, self.page_size, self.sort, self.descending, **self.filters)
+        if len(page) < self.page_size:
+            self._exhausted = True
+        if not page:
+            return
+        self.beginInsertRows(QModelIndex(), len(self._rows), len(self._rows) + len(page) - 1)
+        self._rows.extend(page)
+        self.endInsertRows()
+
+
+# 预测记录页面
 class PredictionRecordPage(QWidget):
     def __init__(self, main_window):
         """初始化预测记录页面"""
@@ -1127,9 +1435,48 @@ class PredictionRecordPage(QWidget):
         layout = QVBoxLayout()
         layout.setSpacing(15)
 
-        self.prediction_table = QTableWidget()
-        self.prediction_table.setColumnCount(5)
-        self.prediction_table.setHorizontalHeaderLabels(["预测ID", "用户ID", "图片路径", "预测结果", "预测时间"])
+        # 筛选和排序条件
+        filter_layout = QHBoxLayout()
+        self.user_edit = QLineEdit()
+        self.user_edit.setPlaceholderText("用户ID")
+        self.user_edit.returnPressed.connect(self.load_prediction_table)
+        filter_layout.addWidget(self.user_edit)
+
+        self.breed_combo = QComboBox()
+        self.breed_combo.addItem("全部犬种", None)
+        for result in self.main_window.db.get_prediction_results():
+            self.breed_combo.addItem(result, result)
+        filter_layout.addWidget(self.breed_combo)
+
+        self.date_check = QCheckBox("按日期")
+        filter_layout.addWidget(self.date_check)
+        today = QDate.currentDate()
+        self.start_date = QDateEdit(today.addDays(-7))
+        self.end_date = QDateEdit(today)
+        for date_edit in (self.start_date, self.end_date):
+            date_edit.setCalendarPopup(True)
+            date_edit.setDisplayFormat("yyyy-MM-dd")
+            filter_layout.addWidget(date_edit)
+
+        self.sort_combo = QComboBox()
+        for label, sort, descending in (("写入顺序", "rowid", False), ("最新优先", "time", True),
+                                        ("最早优先", "time", False), ("按用户", "user", False),
+                                        ("按犬种", "result", False)):
+            self.sort_combo.addItem(label, (sort, descending))
+        filter_layout.addWidget(self.sort_combo)
+
+        self.query_button = QPushButton("查询")
+        self.query_button.clicked.connect(self.load_prediction_table)
+        filter_layout.addWidget(self.query_button)
+        layout.addLayout(filter_layout)
+
+        self.count_label = QLabel()
+        layout.addWidget(self.count_label)
+
+        # 表格只持有已滚动到的行，打开页面只查询总数和第一页
+        self.prediction_model = PredictionTableModel(self.main_window.db)
+        self.prediction_table = QTableView()
+        self.prediction_table.setModel(self.prediction_model)
         self.prediction_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         self.prediction_table.horizontalHeader().setMinimumHeight(40)
         self.prediction_table.horizontalHeader().setDefaultAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -1144,12 +1491,201 @@ class PredictionRecordPage(QWidget):
         self.setLayout(layout)
 
     def load_prediction_table(self):
-        """加载预测记录表格"""
-        predictions = self.main_window.db.get_all_predictions()
-        self.prediction_table.setRowCount(len(predictions))
-        for i, prediction in enumerate(predictions):
-            for j, item in enumerate(prediction):
-                self.prediction_table.setItem(i, j, QTableWidgetItem(str(item)))
+        """按当前筛选和排序条件重新加载预测记录表格"""
+        sort, descending = self.sort_combo.currentData()
+        start = end = None
+        if self.date_check.isChecked():
+            # PREDICTTIME 为 UTC 的 "YYYY-MM-DD HH:MM:SS" 文本，所选日期按本地零点换算成 UTC，结束日期取次日零点（不含）
+            start = self._utc_bound(self.start_date.date())
+            end = self._utc_bound(self.end_date.date().addDays(1))
+        self.prediction_model.set_query(sort, descending, user_id=self.user_edit.text().strip(),
+                                        result=self.breed_combo.currentData(), start=start, end=end)
+        self.count_label.setText(f"共 {self.prediction_model.total} 条预测记录")
+
+    @staticmethod
+    def _utc_bound(date):
+        """把本地日期的零点换算成与 PREDICTTIME 同格式的 UTC 时间文本"""
+        return QDateTime(date, QTime(0, 0)).toUTC().toString("yyyy-MM-dd HH:mm:ss")
+
+    def on_back(self):
+        """返回主页"""
+        self.main_window.setCentralWidget(HomePage(self.main_window))
+        self.close()
+
+
+# 柱状图：用 QPainter 直接绘制 [(标签, 数值)]，horizontal 为 True 时画横向条形图
+class BarChart(QWidget):
+    def __init__(self, title, horizontal=False, color="#4a90d9"):
+        """初始化空图表"""
+        super().__init__()
+        self.title = title
+        self.horizontal = horizontal
+        self.color = QColor(color)
+        self.data = []
+        self.setMinimumHeight(240)
+
+    def set_data(self, data):
+        """替换图表数据并重绘"""
+        self.data = list(data)
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        font = painter.font()
+        font.setPixelSize(13)
+        painter.setFont(font)
+        metrics = painter.fontMetrics()
+        line_height = metrics.height()
+
+        area = self.rect().adjusted(10, 6, -10, -6)
+        painter.setPen(QColor("#000000"))
+        painter.drawText(area.left(), area.top() + metrics.ascent(), self.title)
+        area.setTop(area.top() + line_height + 6)
+        if not self.data:
+            painter.setPen(QColor("#888888"))
+            painter.drawText(area, Qt.AlignmentFlag.AlignCenter, "暂无数据")
+            return
+
+        max_value = max(value for _, value in self.data) or 1
+        if self.horizontal:
+            self._paint_horizontal(painter, area, metrics, max_value)
+        else:
+            # 纵向柱状图不画坐标轴，在标题行右侧标出最大值作为刻度参考
+            painter.drawText(area.left(), area.top() - line_height - 6, area.width(), line_height,
+                             Qt.AlignmentFlag.AlignRight, f"最大 {max_value}")
+            self._paint_vertical(painter, area, metrics, max_value)
+
+    def _paint_horizontal(self, painter, area, metrics, max_value):
+        label_width = min(160, max(metrics.horizontalAdvance(str(label)) for label, _ in self.data) + 8)
+        value_width = metrics.horizontalAdvance(str(max_value)) + 8
+        row_height = min(26, area.height() // len(self.data))
+        bar_space = max(1, area.width() - label_width - value_width)
+        for i, (label, value) in enumerate(self.data):
+            top = area.top() + i * row_height
+            painter.setPen(QColor("#333333"))
+            painter.drawText(area.left(), top, label_width - 8, row_height,
+                             Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter,
+                             metrics.elidedText(str(label), Qt.TextElideMode.ElideRight, label_width - 8))
+            bar_width = max(1, int(bar_space * value / max_value))
+            painter.fillRect(area.left() + label_width, top + 3, bar_width, row_height - 6, self.color)
+            painter.drawText(area.left() + label_width + bar_width + 4, top, value_width, row_height,
+                             Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, str(value))
+
+    def _paint_vertical(self, painter, area, metrics, max_value):
+        label_height = metrics.height() + 4
+        plot_height = max(1, area.height() - label_height)
+        slot_width = area.width() / len(self.data)
+        # 标签按宽度抽稀，避免数据点较多时相互重叠
+        label_width = max(metrics.horizontalAdvance(str(label)) for label, _ in self.data) + 10
+        step = max(1, math.ceil(label_width / max(slot_width, 1)))
+        painter.setPen(QColor("#333333"))
+        for i, (label, value) in enumerate(self.data):
+            left = area.left() + i * slot_width
+            bar_height = int(plot_height * value / max_value)
+            painter.fillRect(int(left + slot_width * 0.1), area.top() + plot_height - bar_height,
+                             max(1, int(slot_width * 0.8)), bar_height, self.color)
+            if i % step == 0:
+                painter.drawText(int(left), area.top() + plot_height + 2, int(label_width), label_height,
+                                 Qt.AlignmentFlag.AlignLeft, str(label))
+
+
+# 数据分析页面：图表数据全部来自触发器维护的汇总表，与预测记录总数无关
+class AnalyticsPage(QWidget):
+    RANGES = (("最近 7 天", 7), ("最近 30 天", 30), ("全部", None))
+
+    def __init__(self, main_window):
+        """初始化数据分析页面"""
+        super().__init__()
+        self.main_window = main_window
+        self.initUI()
+
+    def initUI(self):
+        self.setWindowTitle("数据分析")
+        layout = QVBoxLayout()
+        layout.setSpacing(15)
+
+        control_layout = QHBoxLayout()
+        self.range_combo = QComboBox()
+        for label, days in self.RANGES:
+            self.range_combo.addItem(label, days)
+        self.range_combo.currentIndexChanged.connect(self.load_charts)
+        control_layout.addWidget(self.range_combo)
+        self.granularity_combo = QComboBox()
+        self.granularity_combo.addItem("按天", "day")
+        self.granularity_combo.addItem("按小时", "hour")
+        self.granularity_combo.currentIndexChanged.connect(self.load_charts)
+        control_layout.addWidget(self.granularity_combo)
+        layout.addLayout(control_layout)
+
+        self.trend_chart = BarChart("预测次数趋势")
+        layout.addWidget(self.trend_chart)
+        chart_layout = QHBoxLayout()
+        self.breed_chart = BarChart("犬种分布", horizontal=True)
+        self.user_chart = BarChart("用户预测次数排行", horizontal=True, color="#e0913a")
+        chart_layout.addWidget(self.breed_chart)
+        chart_layout.addWidget(self.user_chart)
+        layout.addLayout(chart_layout)
+
+        self.status_label = QLabel("")
+        self.status_label.setStyleSheet("font-size: 16px; color: #666666;")
+        layout.addWidget(self.status_label)
+
+        self.back_button = QPushButton("返回主页")
+        self.back_button.clicked.connect(self.on_back)
+        layout.addWidget(self.back_button)
+
+        self.setLayout(layout)
+        self.load_charts()
+
+    @staticmethod
+    def _start_day(days):
+        """返回 days 天前的本地日期（与汇总表的日期一致），days 为 None 时不限制"""
+        if days is None:
+            return ""
+        return time.strftime("%Y-%m-%d", time.localtime(time.time() - (days - 1) * 86400))
+
+    @staticmethod
+    def _fill_buckets(rows, start_day, hourly):
+        """把汇总表只含有数据的 [(桶, 次数)] 补全为从 start_day（为空时取第一个桶）到现在的连续序列，缺少的桶记为 0"""
+        counts = dict(rows)
+        if not start_day and not counts:
+            return []
+        # 汇总表的桶为本地时间，从起始日零点起按本地时间逐个生成
+        bucket = datetime.datetime.strptime((start_day or min(counts))[:10], "%Y-%m-%d")
+        if hourly:
+            key_format, step = "%Y-%m-%d %H", datetime.timedelta(hours=1)
+        else:
+            key_format, step = "%Y-%m-%d", datetime.timedelta(days=1)
+        last = time.strftime(key_format)
+        filled = []
+        while True:
+            key = bucket.strftime(key_format)
+            if key > last:
+                return filled
+            filled.append((key, counts.get(key, 0)))
+            bucket += step
+
+    def load_charts(self):
+        """从汇总表加载三张图表"""
+        db = self.main_window.db
+        start = time.perf_counter()
+        days = self.range_combo.currentData()
+        start_day = self._start_day(days)
+        if self.granularity_combo.currentData() == "hour":
+            # 按小时最多显示 7 天，柱子过密时已无法分辨
+            hourly_start = self._start_day(min(days or 7, 7))
+            self.trend_chart.title = "每小时预测次数（最近 7 天内）" if (days or 8) > 7 else "每小时预测次数"
+            hourly = self._fill_buckets(db.get_hourly_counts(hourly_start), hourly_start, hourly=True)
+            self.trend_chart.set_data((hour[5:].replace("-", "/"), count) for hour, count in hourly)
+        else:
+            self.trend_chart.title = "每日预测次数"
+            daily = self._fill_buckets(db.get_daily_counts(start_day), start_day, hourly=False)
+            self.trend_chart.set_data((day[5:], count) for day, count in daily)
+        self.breed_chart.set_data(db.get_breed_totals(start_day, limit=10))
+        self.user_chart.set_data(db.get_user_totals(start_day, limit=10))
+        elapsed = (time.perf_counter() - start) * 1000
+        self.status_label.setText(f"统计查询耗时 {elapsed:.1f} ms")
 
     def on_back(self):
         """返回主页"""
@@ -1370,7 +1906,7 @@ class ProfilePage(QWidget):
             print("保存出错：", e)
             QMessageBox.critical(self, "保存错误", f"保存失败：{str(e)}")
 
-# 预测页面（未修改）
+# 预测页面
 class PredictionPage(QWidget):
     def __init__(self, main_window):
         """初始化预测页面"""
@@ -1378,18 +1914,41 @@ class PredictionPage(QWidget):
         self.main_window = main_window
         self.model_path = os.getenv("MODEL_PATH", "./best.pt")
         self.initUI()
-        self.model = YOLOModel(model_path=self.model_path)
+        self.model = YOLOModel(model_path=self.model_path, cache=result_cache)
         self.video_path = None
-        self.video_capture = None
+        self.video_decoder = None
         self.current_frame = None
+        self._release_current_frame = None
+        self.current_frame_index = 0
+        self.batch_worker = None
+        self.batch_records = []
+        self.analysis_worker = None
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_frame)
         self.auto_tracking = False
+        # 进度条跳转防抖：连续的 valueChanged 合并为一次，拖动时只显示预览，松开后再精确跳转
+        self.seek_timer = QTimer()
+        self.seek_timer.setSingleShot(True)
+        self.seek_timer.setInterval(40)
+        self.seek_timer.timeout.connect(self.on_seek_timeout)
+        self._resume_after_seek = False
+
+        # 解码后的帧经有界队列交给推理线程，结果通过信号回到界面线程显示；被丢弃的帧归还解码缓冲区
+        self.frame_queue = FrameQueue(maxsize=2, on_drop=lambda job: job[3]())
+        self.inference_worker = InferenceWorker(self.model, self.frame_queue)
+        self.inference_worker.frame_ready.connect(self.on_frame_ready)
+        self.inference_worker.start()
+        QApplication.instance().aboutToQuit.connect(self.stop_pipeline)
 
     def update_model(self, new_model_path):
         """更新模型路径并重新加载模型"""
+        model_registry.evict(self.model.model_path)
         self.model_path = new_model_path
-        self.model = YOLOModel(model_path=self.model_path)
+        self.model = YOLOModel(model_path=self.model_path, cache=result_cache)
+        self.inference_worker.set_model(self.model)
+        if self.video_path:
+            # 离线分析结果与模型绑定，换模型后只使用新模型分析过的结果
+            self.inference_worker.video_detections = find_video_detections(self.video_path, self.model)
         QMessageBox.information(self, "模型更新", "模型已成功更新！")
 
     def initUI(self):
@@ -1405,8 +1964,19 @@ class PredictionPage(QWidget):
         self.video_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.video_label.setStyleSheet("background-color: #000000; border-radius: 10px;")
         self.video_label.setMinimumSize(400, 400)
+        # 画面按标签尺寸渲染，不让图片尺寸反过来撑大标签
+        self.video_label.setSizePolicy(QSizePolicy.Policy.Ignored, QSizePolicy.Policy.Ignored)
         left_layout.addWidget(self.video_label)
 
+        # 批量识别结果画廊，仅在多选上传时显示
+        self.gallery = QListWidget()
+        self.gallery.setViewMode(QListWidget.ViewMode.IconMode)
+        self.gallery.setIconSize(QSize(160, 160))
+        self.gallery.setResizeMode(QListWidget.ResizeMode.Adjust)
+        self.gallery.setStyleSheet("font-size: 14px;")
+        self.gallery.setVisible(False)
+        left_layout.addWidget(self.gallery)
+
         right_layout = QVBoxLayout()
         right_layout.setSpacing(15)
         right_frame = QFrame()
@@ -1417,14 +1987,30 @@ class PredictionPage(QWidget):
         self.auto_track_button.clicked.connect(self.on_auto_track)
         right_layout.addWidget(self.auto_track_button)
 
+        self.adaptive_button = QPushButton("自适应步长：关")
+        self.adaptive_button.setCheckable(True)
+        self.adaptive_button.clicked.connect(self.on_adaptive_toggled)
+        right_layout.addWidget(self.adaptive_button)
+
+        self.resolution_button = QPushButton("动态分辨率：关")
+        self.resolution_button.setCheckable(True)
+        self.resolution_button.clicked.connect(self.on_resolution_toggled)
+        right_layout.addWidget(self.resolution_button)
+
         self.upload_video_button = QPushButton("上传视频")
         self.upload_video_button.clicked.connect(self.on_upload_video)
         right_layout.addWidget(self.upload_video_button)
 
+        self.analyze_button = QPushButton("分析视频")
+        self.analyze_button.clicked.connect(self.on_analyze_video)
+        right_layout.addWidget(self.analyze_button)
+
         self.video_slider = QSlider(Qt.Orientation.Horizontal)
         self.video_slider.setMinimum(0)
         self.video_slider.setMaximum(100)
         self.video_slider.valueChanged.connect(self.on_slider_changed)
+        self.video_slider.sliderPressed.connect(self.on_slider_pressed)
+        self.video_slider.sliderReleased.connect(self.on_slider_released)
         right_layout.addWidget(self.video_slider)
 
         self.play_button = QPushButton("播放")
@@ -1452,6 +2038,11 @@ class PredictionPage(QWidget):
         self.result_label.setStyleSheet("font-size: 25px; color: #000000;")
         right_layout.addWidget(self.result_label)
 
+        self.status_label = QLabel("")
+        self.status_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.status_label.setStyleSheet("font-size: 16px; color: #666666;")
+        right_layout.addWidget(self.status_label)
+
         self.back_button = QPushButton("返回主页")
         self.back_button.clicked.connect(self.on_back)
         right_layout.addWidget(self.back_button)
@@ -1462,7 +2053,7 @@ class PredictionPage(QWidget):
 
     def on_auto_track(self):
         """自动跟踪功能开关"""
-        if self.video_capture is None:
+        if self.video_decoder is None:
             QMessageBox.warning(self, "错误", "请先上传视频！")
             self.auto_track_button.setChecked(False)
             self.auto_track_button.setText("开始自动跟踪")
@@ -1479,83 +2070,230 @@ class PredictionPage(QWidget):
             self.auto_tracking = False
             self.auto_track_button.setText("开始自动跟踪")
             self.result_label.setText("预测结果将显示在这里")
-            self.model.reset_model()
+            self.inference_worker.request_reset()
+
+    def on_adaptive_toggled(self):
+        """切换自适应检测步长"""
+        enabled = self.adaptive_button.isChecked()
+        self.inference_worker.adaptive = enabled
+        self.adaptive_button.setText("自适应步长：开" if enabled else "自适应步长：关")
+
+    def on_resolution_toggled(self):
+        """切换动态推理分辨率"""
+        enabled = self.resolution_button.isChecked()
+        if enabled and not self.model.supports_dynamic_imgsz:
+            QMessageBox.warning(self, "提示", "当前模型的输入尺寸在导出时已固定（导出时未使用 --dynamic），无法动态调整分辨率！")
+            self.resolution_button.setChecked(False)
+            return
+        self.inference_worker.resolution_controller.reset()
+        self.inference_worker.dynamic_resolution = enabled
+        self.resolution_button.setText("动态分辨率：开" if enabled else "动态分辨率：关")
 
     def on_upload_video(self):
         """上传视频文件"""
         self.video_path, _ = QFileDialog.getOpenFileName(self, "选择视频文件", "", "Videos (*.mp4 *.avi *.mov)")
         if self.video_path:
-            self.video_capture = cv2.VideoCapture(self.video_path)
-            if not self.video_capture.isOpened():
+            self.close_video()
+            decoder = FrameDecoder(self.video_path)
+            if not decoder.isOpened():
+                decoder.capture.release()
                 QMessageBox.warning(self, "错误", "无法打开视频文件！")
                 return
 
-            self.total_frames = int(self.video_capture.get(cv2.CAP_PROP_FRAME_COUNT))
-            self.fps = self.video_capture.get(cv2.CAP_PROP_FPS)
+            self.video_decoder = decoder
+            self.video_decoder.preview_ready.connect(self.on_preview_ready)
+            self.video_decoder.start()
+            self.total_frames = self.video_decoder.total_frames
+            self.fps = self.video_decoder.fps
+            self.inference_worker.frame_budget_ms = 1000 // max(self.fps, 1)
             self.video_slider.setMaximum(self.total_frames)
             self.auto_tracking = False
             self.auto_track_button.setChecked(False)
             self.auto_track_button.setText("开始自动跟踪")
             self.result_label.setText("预测结果将显示在这里")
-            self.update_frame()
-
-    def update_frame(self):
-        """更新视频帧并进行自动跟踪"""
-        if self.video_capture is None:
+            self.inference_worker.request_reset()
+            self.inference_worker.video_detections = find_video_detections(self.video_path, self.model)
+            if self.inference_worker.video_detections is not None:
+                self.result_label.setText("已加载该视频的分析结果，自动跟踪将直接显示")
+            self.update_frame(wait=1.0)
+
+    def on_analyze_video(self):
+        """在后台分析整段视频，完成后播放和拖动只绘制缓存的检测结果"""
+        if self.video_decoder is None:
+            QMessageBox.warning(self, "错误", "请先上传视频！")
+            return
+        if self.analysis_worker is not None:
+            QMessageBox.warning(self, "错误", "视频分析正在进行中！")
+            return
+        self.analyze_button.setEnabled(False)
+        self.result_label.setText("视频分析中...")
+        self.analysis_worker = VideoAnalysisWorker(self.model.model_path, self.model.backend, self.video_path)
+        self.analysis_worker.progress.connect(
+            lambda done, total: self.result_label.setText(f"视频分析中 {done}/{total}"))
+        self.analysis_worker.finished.connect(self.on_analysis_finished)
+        self.analysis_worker.start()
+
+    def on_analysis_finished(self):
+        """视频分析结束后启用缓存的检测结果"""
+        worker = self.analysis_worker
+        if worker is None:
+            return
+        self.analysis_worker = None
+        self.analyze_button.setEnabled(True)
+        if worker.error:
+            QMessageBox.warning(self, "错误", f"视频分析失败：{worker.error}")
+            return
+        if worker.detections is None or worker.video_path != self.video_path:
+            return  # 分析被取消，或期间已换了视频
+        self.inference_worker.video_detections = worker.detections
+        frames = worker.detections.frame_count
+        rate = frames / worker.elapsed if worker.elapsed > 0 else 0.0
+        self.result_label.setText(f"视频分析完成：{frames} 帧，{rate:.1f} 帧/秒")
+
+    def update_frame(self, wait=0):
+        """从解码缓冲区取出下一帧并提交给推理线程"""
+        if self.video_decoder is None:
             return
 
-        ret, frame = self.video_capture.read()
-        if not ret:
-            self.timer.stop()
-            QMessageBox.information(self, "提示", "视频播放完毕！")
+        # 定时器触发时只从预读缓冲区取帧；缓冲区暂时为空（解码跟不上）则跳过本次
+        item = self.video_decoder.read(timeout=wait)
+        if item is None:
+            if self.video_decoder.at_end:
+                self.timer.stop()
+                self.play_button.setText("播放")
+                QMessageBox.information(self, "提示", "视频播放完毕！")
             return
 
+        frame_index, slot, frame = item
+        # 界面和推理线程各持有一次引用，帧直接引用解码缓冲区，不复制
+        self._set_current_frame(frame, functools.partial(self.video_decoder.release, slot))
+        self.current_frame_index = frame_index
+        self.video_decoder.retain(slot)
+        self.frame_queue.put((frame, frame_index, self.auto_tracking,
+                              functools.partial(self.video_decoder.release, slot)))
+
+    def _set_current_frame(self, frame, release=None):
+        """替换截图使用的当前帧，归还上一帧占用的解码缓冲区"""
+        if self._release_current_frame is not None:
+            self._release_current_frame()
         self.current_frame = frame
-
-        if self.auto_tracking:
-            results = self.model.track(frame)
-            detected_objects = []
-            if len(results) > 0:
-                boxes = results[0].boxes
-                for box in boxes:
-                    class_id = int(box.cls[0])
-                    class_name = self.model.model.names[class_id]
-                    chinese_class_name = self.model.class_name_map.get(class_name, class_name)
-                    confidence = float(box.conf[0])
-
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-
-                    frame_pil = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-                    draw = ImageDraw.Draw(frame_pil)
-                    try:
-                        font = ImageFont.truetype("SimHei.ttf", 24)
-                    except:
-                        font = ImageFont.load_default()
-                    label = f"{class_name} {confidence:.2f}"
-                    draw.text((x1, y1 - 30), label, font=font, fill=(0, 255, 0, 255))
-                    frame = cv2.cvtColor(np.array(frame_pil), cv2.COLOR_RGB2BGR)
-
-                    detected_objects.append(f"{chinese_class_name} ({confidence:.2f})")
-                if detected_objects:
-                    self.result_label.setText("检测到: " + ", ".join(detected_objects))
-                else:
-                    self.result_label.setText("未检测到目标")
-
-        height, width, channel = frame.shape
-        bytes_per_line = 3 * width
-        q_img = QImage(frame.data, width, height, bytes_per_line, QImage.Format.Format_BGR888)
-        self.video_label.setPixmap(QPixmap.fromImage(q_img))
+        self._release_current_frame = release
+
+    def resizeEvent(self, event):
+        """画面区域尺寸变化后，推理线程按新尺寸缩放画面"""
+        super().resizeEvent(event)
+        self.inference_worker.display_size = (self.video_label.width(), self.video_label.height())
+
+    def on_frame_ready(self, q_img, result_text, frame_index, slot, ticket):
+        """显示推理线程渲染完成的画面"""
+        if not self.inference_worker.claim_buffer(slot, ticket):
+            return  # 画面已被更新的画面取代，缓冲区已由推理线程回收
+        if self.video_decoder is None:
+            self.inference_worker.release_buffer(slot)
+            return  # 清空后仍在途的帧不再显示
+        # BGR888 需转换为屏幕像素格式，fromImage 会复制像素数据，之后即可归还显示缓冲区
+        pixmap = QPixmap.fromImage(q_img)
+        self.inference_worker.release_buffer(slot)
+        self.video_label.setPixmap(pixmap)
+        if result_text and self.auto_tracking:
+            self.result_label.setText(result_text)
+        worker = self.inference_worker
+        decoder = self.video_decoder
+        status = (f"解码 {decoder.decode_fps:.0f} FPS | 缓冲 {decoder.occupancy()}/{decoder.capacity} | "
+                  f"推理 {worker.infer_fps:.1f} FPS | 丢帧 {self.frame_queue.dropped + worker.display_buffers.dropped}")
+        if self.auto_tracking and worker.video_detections is not None:
+            status += " | 使用分析结果"
+        elif self.auto_tracking:
+            status += f" | 单帧 {worker.infer_ms:.0f} ms"
+            if worker.dynamic_resolution:
+                controller = worker.resolution_controller
+                status += f" | 分辨率 {controller.imgsz} | 中位耗时 {controller.latency_ms:.0f} ms"
+            if worker.adaptive:
+                status += f" | 检测步长 {worker.stride_controller.stride}"
+        self.status_label.setText(status)
+
+    def close_video(self):
+        """停止解码线程和视频分析，关闭当前视频"""
+        self._set_current_frame(None)
+        if self.video_decoder:
+            self.video_decoder.stop()
+            self.video_decoder = None
+        if self.analysis_worker is not None:
+            # CPU 上一批跟踪可能要几秒，不在界面线程中等待；线程结束后由 finished 信号调用 on_analysis_finished
+            self.analysis_worker.request_stop()
+        self.inference_worker.video_detections = None
+
+    def stop_pipeline(self):
+        """停止后台解码、推理、视频分析和批量识别线程"""
+        self.close_video()
+        if self.analysis_worker is not None:
+            # 离开页面或退出程序时必须等线程结束，否则 QThread 会在运行中被销毁
+            self.analysis_worker.stop()
+            self.on_analysis_finished()
+        if self.batch_worker is not None and self.batch_worker.isRunning():
+            self.batch_worker.stop()
+            if self.batch_records:
+                # 提前结束时保存已完成部分的记录
+                self.main_window.db.add_predictions(self.batch_records)
+                self.batch_records = []
+        if self.inference_worker.isRunning():
+            self.inference_worker.stop()
 
     def on_slider_changed(self, value):
-        """滑动条改变视频帧位置"""
-        if self.video_capture:
-            self.video_capture.set(cv2.CAP_PROP_POS_FRAMES, value)
-            self.update_frame()
+        """滑动条改变视频帧位置，短时间内的多次变化只处理最后一次"""
+        if self.video_decoder:
+            self.seek_timer.start()
+
+    def on_slider_pressed(self):
+        """开始拖动时暂停播放，松开后恢复"""
+        self._resume_after_seek = self.timer.isActive()
+        self.timer.stop()
+
+    def on_slider_released(self):
+        """松开进度条后立即精确跳转"""
+        self.seek_timer.stop()
+        self.seek_to(self.video_slider.value())
+        if self._resume_after_seek and self.video_decoder is not None:
+            self.timer.start(1000 // self.fps)
+        self._resume_after_seek = False
+
+    def on_seek_timeout(self):
+        """拖动中显示预览，点击或键盘调整时直接精确跳转"""
+        if self.video_slider.isSliderDown():
+            self.show_preview(self.video_slider.value())
+        else:
+            self.seek_to(self.video_slider.value())
+
+    def seek_to(self, frame_index):
+        """精确跳转到指定帧，并把该帧交给推理线程"""
+        if self.video_decoder:
+            self.video_decoder.seek(frame_index)
+            self.update_frame(wait=1.0)
+
+    def show_preview(self, frame_index):
+        """显示预览缓存中最接近的帧，缓存中没有时请求解码线程解码所在 GOP 的关键帧"""
+        decoder = self.video_decoder
+        if decoder is None:
+            return
+        cached = decoder.nearest_preview(frame_index)
+        if cached is None:
+            decoder.request_preview(frame_index)
+            return
+        preview = cached[1]
+        height, width = preview.shape[:2]
+        q_img = QImage(preview.data, width, height, 3 * width, QImage.Format.Format_BGR888)
+        self.on_preview_ready(cached[0], q_img.copy())
+
+    def on_preview_ready(self, frame_index, q_img):
+        """拖动进度条期间显示低分辨率预览"""
+        if not self.video_slider.isSliderDown():
+            return  # 已松开，精确跳转的画面随后显示
+        self.video_label.setPixmap(QPixmap.fromImage(q_img).scaled(
+            self.video_label.size(), Qt.AspectRatioMode.KeepAspectRatio))
 
     def on_play(self):
         """播放或暂停视频"""
-        if self.video_capture is None:
+        if self.video_decoder is None:
             QMessageBox.warning(self, "错误", "请先上传视频！")
             return
         if self.timer.isActive():
@@ -1565,39 +2303,50 @@ class PredictionPage(QWidget):
             self.timer.start(1000 // self.fps)
             self.play_button.setText("暂停")
 
+    def show_frame(self, frame):
+        """在画面区域显示内存中的 BGR 帧"""
+        height, width, channel = frame.shape
+        q_img = QImage(frame.data, width, height, 3 * width, QImage.Format.Format_BGR888)
+        pixmap = QPixmap.fromImage(q_img)
+        self.video_label.setPixmap(pixmap.scaled(400, 400, Qt.AspectRatioMode.KeepAspectRatio))
+
     def on_snapshot(self):
         """截图并进行识别"""
         if self.current_frame is None:
             QMessageBox.warning(self, "错误", "没有可截图的视频帧！")
             return
 
-        temp_image_path = "temp_frame.jpg"
-        cv2.imwrite(temp_image_path, self.current_frame)
-
-        class_name, confidence, save_dir = self.model.predict(temp_image_path)
+        # 动态分辨率开启时截图与跟踪使用相同的输入尺寸
+        worker = self.inference_worker
+        imgsz = worker.resolution_controller.imgsz if worker.dynamic_resolution else None
+        class_name, confidence, annotated = self.model.predict(self.current_frame, imgsz=imgsz)
         if class_name and confidence:
-            result_image_path = f"{save_dir}/{temp_image_path.split('/')[-1]}"
-            result_pixmap = QPixmap(result_image_path)
-            self.video_label.setPixmap(result_pixmap.scaled(400, 400, Qt.AspectRatioMode.KeepAspectRatio))
+            self.show_frame(annotated)
+            image_archiver.submit(annotated, f"snapshot_{self.current_frame_index}")
             self.result_label.setText(f"预测结果：{class_name}，置信度：{confidence:.2f}")
 
+            # 截图不落盘，记录视频路径和帧序号作为图片来源
             user_id = self.main_window.current_user[0]
-            self.main_window.db.add_prediction(user_id, temp_image_path, class_name)
+            self.main_window.db.add_prediction(user_id, f"{self.video_path}#{self.current_frame_index}", class_name)
         else:
             self.result_label.setText("未检测到目标")
 
     def on_upload(self):
-        """上传图片并进行预测"""
-        file_path, _ = QFileDialog.getOpenFileName(self, "选择图片", "", "Images (*.png *.jpg *.jpeg)")
-        if file_path:
+        """上传图片并进行预测，多选时批量识别"""
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "选择图片", "", "Images (*.png *.jpg *.jpeg)")
+        if len(file_paths) > 1:
+            self.start_batch_prediction(file_paths)
+            return
+        if file_paths:
+            file_path = file_paths[0]
             pixmap = QPixmap(file_path)
             self.video_label.setPixmap(pixmap.scaled(400, 400, Qt.AspectRatioMode.KeepAspectRatio))
 
-            class_name, confidence, save_dir = self.model.predict(file_path)
+            class_name, confidence, annotated = self.model.predict(file_path)
+            self.show_cache_stats()
             if class_name and confidence:
-                result_image_path = f"{save_dir}/{file_path.split('/')[-1]}"
-                result_pixmap = QPixmap(result_image_path)
-                self.video_label.setPixmap(result_pixmap.scaled(400, 400, Qt.AspectRatioMode.KeepAspectRatio))
+                self.show_frame(annotated)
+                image_archiver.submit(annotated, file_path)
                 self.result_label.setText(f"预测结果：{class_name}，置信度：{confidence:.2f}")
 
                 user_id = self.main_window.current_user[0]
@@ -1605,13 +2354,68 @@ class PredictionPage(QWidget):
             else:
                 self.result_label.setText("未检测到目标")
 
+    def show_cache_stats(self):
+        """在状态栏显示识别结果缓存的命中情况"""
+        stats = result_cache.stats()
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        self.status_label.setText(
+            f"缓存命中 {hits}（内存 {stats['memory_hits']}，磁盘 {stats['disk_hits']}） | 未命中 {stats['misses']}")
+
+    def show_writer_stats(self):
+        """在状态栏追加预测记录写入队列的深度和提交耗时"""
+        writer = self.main_window.db.prediction_writer
+        if writer is None:
+            return
+        metrics = writer.metrics()
+        self.status_label.setText(
+            f"{self.status_label.text()} | 写库队列 {metrics['queue_depth']} | "
+            f"提交 {metrics['last_commit_ms']:.1f} ms（平均 {metrics['avg_commit_ms']:.1f} ms）")
+
+    def start_batch_prediction(self, file_paths):
+        """启动批量识别，结果逐张加入画廊"""
+        if self.batch_worker is not None and self.batch_worker.isRunning():
+            QMessageBox.warning(self, "错误", "批量识别正在进行中！")
+            return
+        self.gallery.clear()
+        self.gallery.setVisible(True)
+        self.batch_records = []
+        self.upload_button.setEnabled(False)
+        self.result_label.setText(f"批量识别中 0/{len(file_paths)}")
+
+        self.batch_worker = BatchPredictWorker(self.model, file_paths)
+        self.batch_worker.result_ready.connect(self.on_batch_result)
+        self.batch_worker.progress.connect(
+            lambda done, total: self.result_label.setText(f"批量识别中 {done}/{total}"))
+        self.batch_worker.finished.connect(self.on_batch_finished)
+        self.batch_worker.start()
+
+    def on_batch_result(self, path, class_name, confidence, thumbnail):
+        """把单张图片的识别结果加入画廊"""
+        text = f"{class_name} {confidence:.2f}" if class_name else "未检测到目标"
+        item = QListWidgetItem(QIcon(QPixmap.fromImage(thumbnail)), text)
+        item.setToolTip(path)
+        self.gallery.addItem(item)
+        if class_name:
+            self.batch_records.append((self.main_window.current_user[0], path, class_name))
+
+    def on_batch_finished(self):
+        """批量识别结束后在一个事务中写入所有预测记录"""
+        worker = self.batch_worker
+        self.upload_button.setEnabled(True)
+        if self.batch_records:
+            self.main_window.db.add_predictions(self.batch_records)
+        count = self.gallery.count()
+        rate = count / worker.elapsed if worker.elapsed > 0 else 0.0
+        self.result_label.setText(f"批量识别完成：{len(self.batch_records)}/{count} 张识别成功，{rate:.1f} 张/秒")
+        self.show_cache_stats()
+        self.show_writer_stats()
+        self.batch_records = []
+
     def on_clear(self):
         """清空当前内容"""
         if self.timer.isActive():
             self.timer.stop()
-        if self.video_capture:
-            self.video_capture.release()
-            self.video_capture = None
+        self.close_video()
         self.video_path = None
         self.current_frame = None
         self.auto_tracking = False
@@ -1619,9 +2423,14 @@ class PredictionPage(QWidget):
         self.auto_track_button.setText("开始自动跟踪")
         self.play_button.setText("播放")
         self.video_slider.setValue(0)
+        self.frame_queue.clear()
         self.video_label.clear()
+        if self.batch_worker is None or not self.batch_worker.isRunning():
+            self.gallery.clear()
+            self.gallery.setVisible(False)
         self.result_label.setText("预测结果将显示在这里")
-        self.model.reset_model()
+        self.status_label.clear()
+        self.inference_worker.request_reset()
         QMessageBox.information(self, "提示", "已清空当前内容！")
 
     def on_feedback(self):
@@ -1630,10 +2439,12 @@ class PredictionPage(QWidget):
         self.feedback_page.show()
 
     def on_back(self):
-        if self.video_capture:
-            self.video_capture.release()
-        if hasattr(self.model, 'trackers'):
-            self.model.reset_model()
+        self.timer.stop()
+        self.stop_pipeline()
+        # 断开退出回调，否则应用会一直持有已离开的页面，每次进入页面都多叠加一个回调
+        QApplication.instance().aboutToQuit.disconnect(self.stop_pipeline)
+        # 模型由注册表共享，离开页面时清除跟踪状态，避免带入下一次预测
+        self.model.reset_model()
         self.main_window.open_home_page()
         self.close()
 
@@ -1663,7 +2474,15 @@ if __name__ == "__main__":
     app = QApplication(sys.argv)
     app.setStyleSheet(GLOBAL_STYLESHEET)
     db = Database("database.db")
+    # 结果缓存的写入交给同一数据库文件的写入线程，缓存放在其他文件时只建缓存表并单独开一个写入线程
+    cache_writer = db.prediction_writer if os.path.abspath(result_cache.db_name) == os.path.abspath("database.db") \
+        else open_result_cache_writer(result_cache.db_name)
+    result_cache.attach(cache_writer)
     window = MainWindow(db)
     window.show()
-    sys.exit(app.exec())
-    db.close()
\ No newline at end of file
+    exit_code = app.exec()
+    image_archiver.close()
+    if cache_writer is not None and cache_writer is not db.prediction_writer:
+        cache_writer.close()
+    db.close()
+    sys.exit(exit_code)
\ No newline at end of file
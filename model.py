@@ -0,0 +1,922 @@
+import hashlib
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+from PIL import Image, ImageDraw, ImageFont
+from ultralytics import YOLO
+
+# 加载 .env 文件
+load_dotenv()
+
+# 获取模型路径
+MODEL_PATH = os.getenv("MODEL_PATH", "./best.pt")
+
+# 推理后端：auto 按 MODEL_PATH 扩展名选择，也可指定 pytorch / onnx / openvino
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "auto").lower()
+
+# 标注结果归档配置（默认关闭，识别结果只在内存中显示）
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "false").lower() in ("1", "true", "yes")
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./runs/archive")
+ARCHIVE_FORMAT = os.getenv("ARCHIVE_FORMAT", "jpg")
+ARCHIVE_QUALITY = int(os.getenv("ARCHIVE_QUALITY", "90"))
+ARCHIVE_MAX_FILES = int(os.getenv("ARCHIVE_MAX_FILES", "1000"))
+
+# 批量识别每批送入网络的图片数
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "8"))
+
+# 识别结果缓存：相同图片内容和相同模型直接返回缓存结果
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESULT_CACHE_DB = os.getenv("RESULT_CACHE_DB", "database.db")
+
+# 整段视频离线分析结果的保存目录和每批送入跟踪器的帧数
+ANALYSIS_DIR = os.getenv("ANALYSIS_DIR", "./runs/analysis")
+ANALYSIS_BATCH_SIZE = int(os.getenv("ANALYSIS_BATCH_SIZE", "16"))
+
+
+def resolve_model_path(model_path, backend=MODEL_BACKEND):
+    """根据后端设置确定实际加载的模型文件，返回 (模型路径, 后端名称)
+
+    backend 为 auto 时按扩展名判断；指定了与文件不同的后端时，使用同目录下导出的
+    best.onnx 或 best_openvino_model/，不存在则退回原文件。
+    """
+    stem, ext = os.path.splitext(model_path.rstrip("/\\"))
+    ext = ext.lower()
+    is_openvino_ir = ext == ".xml"
+    if is_openvino_ir:
+        # OpenVINO IR 由 ultralytics 按目录加载，目录名不一定以 _openvino_model 结尾
+        model_path, stem, ext = os.path.dirname(model_path) or ".", os.path.dirname(model_path), ""
+    if ext == ".onnx":
+        detected = "onnx"
+    elif is_openvino_ir or stem.endswith("_openvino_model"):
+        detected = "openvino"
+    else:
+        detected = "pytorch"
+
+    if backend in ("auto", detected):
+        return model_path, detected
+    if detected == "openvino" and stem.endswith("_openvino_model"):
+        stem = stem[:-len("_openvino_model")]
+    candidates = {
+        "pytorch": stem + ".pt",
+        "onnx": stem + ".onnx",
+        "openvino": stem + "_openvino_model",
+    }
+    candidate = candidates.get(backend)
+    if candidate and os.path.exists(candidate):
+        return candidate, backend
+    print(f"未找到 {backend} 后端的模型文件，使用 {model_path}")
+    return model_path, detected
+
+
+def has_dynamic_input(model_path, backend):
+    """判断模型能否在运行时调整输入尺寸：PyTorch 模型总是可以，导出的模型要求输入的高宽为动态维度（导出时使用了 --dynamic）
+
+    读取导出模型所需的 onnx / onnxruntime / openvino 均未安装时按固定尺寸处理。
+    """
+    if backend == "pytorch":
+        return True
+    try:
+        if backend == "onnx":
+            try:
+                import onnx
+            except ImportError:
+                import onnxruntime
+                session = onnxruntime.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+                return all(not isinstance(dim, int) for dim in session.get_inputs()[0].shape[2:])
+            dims = onnx.load(model_path, load_external_data=False).graph.input[0].type.tensor_type.shape.dim
+            return all(not dim.HasField("dim_value") for dim in dims[2:])
+        if backend == "openvino":
+            import openvino
+            xml_files = [name for name in os.listdir(model_path) if name.endswith(".xml")]
+            if not xml_files:
+                return False
+            shape = openvino.Core().read_model(os.path.join(model_path, xml_files[0])).inputs[0].get_partial_shape()
+            return all(dim.is_dynamic for dim in list(shape)[2:])
+    except ImportError as e:
+        print("无法读取模型输入尺寸，按固定尺寸处理：", e)
+    return False
+
+
+def load_source(source):
+    """读取图片路径或 numpy 帧，返回 (BGR 帧, 内容哈希)，读取失败时帧为 None"""
+    if isinstance(source, np.ndarray):
+        frame = np.ascontiguousarray(source)
+        digest = hashlib.blake2b(str(frame.shape).encode(), digest_size=20)
+        digest.update(frame.data)
+        return frame, digest.hexdigest()
+    try:
+        data = np.fromfile(source, dtype=np.uint8)
+    except OSError as e:
+        print("读取图片失败：", e)
+        return None, None
+    return cv2.imdecode(data, cv2.IMREAD_COLOR), hashlib.blake2b(data.data, digest_size=20).hexdigest()
+
+
+def model_fingerprint(model_path):
+    """由模型文件路径、大小和修改时间生成指纹，模型文件变化后指纹随之变化"""
+    path = os.path.abspath(model_path)
+    if os.path.isdir(path):
+        files = [os.path.join(root, f) for root, _, names in os.walk(path) for f in names]
+    else:
+        files = [path]
+    parts = [path]
+    for f in sorted(files):
+        try:
+            stat = os.stat(f)
+            parts.append(f"{f}:{stat.st_size}:{stat.st_mtime_ns}")
+        except OSError:
+            parts.append(f)
+    return hashlib.blake2b("|".join(parts).encode(), digest_size=16).hexdigest()
+
+
+def video_fingerprint(video_path, samples=16, chunk_size=1 << 16):
+    """由视频文件大小和均匀分布的若干段内容生成哈希，不必读完整个大文件"""
+    size = os.path.getsize(video_path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(video_path, "rb") as f:
+        for i in range(samples):
+            f.seek(max(0, size - chunk_size) * i // max(samples - 1, 1))
+            digest.update(f.read(chunk_size))
+    return digest.hexdigest()
+
+
+def read_image(path):
+    """读取图片为 BGR 帧，兼容包含中文的路径，读取失败返回 None"""
+    try:
+        data = np.fromfile(path, dtype=np.uint8)
+    except OSError as e:
+        print("读取图片失败：", e)
+        return None
+    return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+
+# 进程级模型注册表：按模型路径和文件修改时间缓存已加载的权重
+class ModelRegistry:
+    def __init__(self):
+        """初始化模型注册表"""
+        self._lock = threading.Lock()
+        self._entries = {}  # 绝对路径 -> {"mtime", "model", "load_time", "memory_bytes", "hits"}
+        self.load_count = 0
+        self.hit_count = 0
+
+    @staticmethod
+    def _key(model_path):
+        """返回模型的规范化路径和文件修改时间"""
+        path = os.path.abspath(model_path)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+        return path, mtime
+
+    @staticmethod
+    def _estimate_memory(model, path):
+        """估算模型占用的内存（参数与缓冲区字节数），无法获取时退化为文件大小"""
+        module = getattr(model, "model", None)
+        try:
+            tensors = list(module.parameters()) + list(module.buffers())
+            return sum(t.numel() * t.element_size() for t in tensors)
+        except (AttributeError, TypeError):
+            # 导出的 ONNX/OpenVINO 模型没有 PyTorch 参数，用模型文件大小近似
+            if os.path.isdir(path):
+                return sum(os.path.getsize(os.path.join(root, f))
+                           for root, _, files in os.walk(path) for f in files)
+            try:
+                return os.path.getsize(path)
+            except OSError:
+                return 0
+
+    def get(self, model_path):
+        """获取共享的模型句柄，仅在首次使用或文件发生变化时从磁盘加载"""
+        path, mtime = self._key(model_path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry["mtime"] == mtime:
+                entry["hits"] += 1
+                self.hit_count += 1
+                return entry["model"]
+
+            if entry is not None:
+                print(f"模型文件已变化，重新加载：{path}")
+            start = time.perf_counter()
+            # 导出格式不含任务信息，显式指定为检测任务
+            model = YOLO(path, task="detect")
+            load_time = time.perf_counter() - start
+            self._entries[path] = {
+                "mtime": mtime,
+                "model": model,
+                "load_time": load_time,
+                "memory_bytes": self._estimate_memory(model, path),
+                "hits": 0,
+            }
+            self.load_count += 1
+            print(f"模型加载完成：{path}，耗时 {load_time:.2f} 秒")
+            return model
+
+    def evict(self, model_path=None):
+        """移除指定模型（未指定时移除全部），下次获取时重新加载"""
+        with self._lock:
+            if model_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(model_path), None)
+
+    def metrics(self):
+        """返回已加载模型的加载耗时、内存占用和命中次数"""
+        with self._lock:
+            return {
+                "load_count": self.load_count,
+                "hit_count": self.hit_count,
+                "models": {
+                    path: {
+                        "load_time": entry["load_time"],
+                        "memory_bytes": entry["memory_bytes"],
+                        "hits": entry["hits"],
+                    }
+                    for path, entry in self._entries.items()
+                },
+            }
+
+
+model_registry = ModelRegistry()
+
+
+# YOLOv11 模型类
+class YOLOModel:
+    def __init__(self, model_path, backend=MODEL_BACKEND, cache=None, shared=True):
+        """初始化YOLO模型，按后端设置加载 PyTorch、ONNX 或 OpenVINO 模型
+
+        shared 为 False 时单独加载一份权重，不与其他实例共用跟踪器状态（用于后台整段视频分析）。
+        """
+        self.model_path, self.backend = resolve_model_path(model_path, backend)
+        self.model = model_registry.get(self.model_path) if shared else YOLO(self.model_path, task="detect")
+        self.fingerprint = model_fingerprint(self.model_path)
+        self.cache = cache
+        # 界面预测和批量识别线程共用同一个实例，渲染器随模型一起创建，避免两个线程同时懒加载
+        self.renderer = OverlayRenderer()
+        # 导出的 ONNX/OpenVINO 模型只有以动态输入尺寸导出时才能在运行时调整分辨率
+        self.supports_dynamic_imgsz = has_dynamic_input(self.model_path, self.backend)
+        self.class_name_map = {
+            "Chihuahua": "吉娃娃",
+            "Japanese_spaniel": "日本猎犬",
+            "Maltese_dog": "马尔济斯犬",
+            "Pekinese": "北京犬",
+            "Shih-Tzu": "西施犬",
+            "Blenheim_spaniel": "布伦海姆西班牙猎犬",
+            "papillon": "蝴蝶犬",
+            "toy_terrier": "玩具梗犬",
+            "Rhodesian_ridgeback": "罗得西亚背脊犬",
+            "Afghan_hound": "阿富汗猎犬",
+            "basset": "巴吉度猎犬",
+            "beagle": "比格犬",
+            "bloodhound": "寻血猎犬",
+            "bluetick": "蓝蒂克猎犬",
+            "black-and-tan_coonhound": "黑棕浣熊猎犬",
+            "Walker_hound": "沃克猎犬",
+            "English_foxhound": "英国猎狐犬",
+            "redbone": "红骨猎犬",
+            "borzoi": "波索尔猎犬",
+            "Irish_wolfhound": "爱尔兰狼犬",
+            "Italian_greyhound": "意大利灰狗",
+            "whippet": "惠比特犬",
+            "Ibizan_hound": "伊比莎猎犬",
+            "Norwegian_elkhound": "挪威猎犬",
+            "otterhound": "水獭猎犬",
+            "Saluki": "萨路基犬",
+            "Scottish_deerhound": "苏格兰鹿犬",
+            "Weimaraner": "魏玛犬",
+            "Staffordshire_bullterrier": "斯塔福郡斗牛梗",
+            "American_Staffordshire_terrier": "美国斯塔福郡梗",
+            "Bedlington_terrier": "贝灵顿梗",
+            "Border_terrier": "边境梗",
+            "Kerry_blue_terrier": "凯利蓝梗",
+            "Irish_terrier": "爱尔兰梗",
+            "Norfolk_terrier": "诺福克梗",
+            "Norwich_terrier": "诺维奇梗",
+            "Yorkshire_terrier": "约克夏梗",
+            "wire-haired_fox_terrier": "刚毛狐梗",
+            "Lakeland_terrier": "莱克兰梗",
+            "Sealyham_terrier": "西利哈姆梗",
+            "Airedale": "艾尔代尔梗",
+            "cairn": "凯恩梗",
+            "Australian_terrier": "澳大利亚梗",
+            "Dandie_Dinmont": "丹迪丁蒙梗",
+            "Boston_bull": "波士顿斗牛犬",
+            "miniature_schnauzer": "迷你雪纳瑞",
+            "giant_schnauzer": "巨型雪纳瑞",
+            "standard_schnauzer": "标准雪纳瑞",
+            "Scotch_terrier": "苏格兰梗",
+            "Tibetan_terrier": "西藏梗",
+            "silky_terrier": "丝毛梗",
+            "soft-coated_wheaten_terrier": "软毛麦色梗",
+            "West_Highland_white_terrier": "西高地白梗",
+            "Lhasa": "拉萨犬",
+            "flat-coated_retriever": "平毛寻回犬",
+            "curly-coated_retriever": "卷毛寻回犬",
+            "golden_retriever": "金毛寻回犬",
+            "Labrador_retriever": "拉布拉多寻回犬",
+            "Chesapeake_Bay_retriever": "切萨皮克湾寻回犬",
+            "German_short-haired_pointer": "德国短毛指示犬",
+            "vizsla": "维兹拉犬",
+            "English_setter": "英国塞特犬",
+            "Irish_setter": "爱尔兰塞特犬",
+            "Gordon_setter": "戈登塞特犬",
+            "Brittany_spaniel": "布列塔尼猎犬",
+            "clumber": "克拉姆猎犬",
+            "English_springer": "英国史宾格犬",
+            "Welsh_springer_spaniel": "威尔士史宾格犬",
+            "cocker_spaniel": "可卡犬",
+            "Sussex_spaniel": "苏塞克斯猎犬",
+            "Irish_water_spaniel": "爱尔兰水猎犬",
+            "kuvasz": "库瓦斯犬",
+            "schipperke": "斯希珀基犬",
+            "groenendael": "格罗宁达尔犬",
+            "malinois": "马里努阿犬",
+            "briard": "布里亚德犬",
+            "kelpie": "凯尔皮犬",
+            "komondor": "科蒙多犬",
+            "Old_English_sheepdog": "古老英国牧羊犬",
+            "Shetland_sheepdog": "设得兰牧羊犬",
+            "collie": "柯利犬",
+            "Border_collie": "边境柯利犬",
+            "Bouvier_des_Flandres": "弗兰德斯牧牛犬",
+            "Rottweiler": "罗威纳犬",
+            "German_shepherd": "德国牧羊犬",
+            "Doberman": "杜宾犬",
+            "miniature_pinscher": "迷你杜宾犬",
+            "Greater_Swiss_Mountain_dog": "大瑞士山地犬",
+            "Bernese_mountain_dog": "伯恩山犬",
+            "Appenzeller": "阿彭策尔山犬",
+            "EntleBucher": "恩特布赫山犬",
+            "boxer": "拳师犬",
+            "bull_mastiff": "斗牛獒",
+            "Tibetan_mastiff": "藏獒",
+            "French_bulldog": "法国斗牛犬",
+            "Great_Dane": "大丹犬",
+            "Saint_Bernard": "圣伯纳犬",
+            "Eskimo_dog": "爱斯基摩犬",
+            "malamute": "马拉缪犬",
+            "Siberian_husky": "西伯利亚哈士奇",
+            "affenpinscher": "阿芬犬",
+            "basenji": "巴辛吉犬",
+            "pug": "巴哥犬",
+            "Leonberg": "莱昂伯格犬",
+            "Newfoundland": "纽芬兰犬",
+            "Great_Pyrenees": "大白熊犬",
+            "Samoyed": "萨摩耶犬",
+            "Pomeranian": "博美犬",
+            "chow": "松狮犬",
+            "keeshond": "荷兰毛狮犬",
+            "Brabancon_griffon": "布拉邦松格里芬犬",
+            "Pembroke": "彭布罗克威尔士柯基",
+            "Cardigan": "卡迪根威尔士柯基",
+            "toy_poodle": "玩具贵宾犬",
+            "miniature_poodle": "迷你贵宾犬",
+            "standard_poodle": "标准贵宾犬",
+            "Mexican_hairless": "墨西哥无毛犬",
+            "dingo": "澳洲野犬",
+            "dhole": "亚洲野犬",
+            "African_hunting_dog": "非洲猎犬"
+        }
+        print(f"推理后端：{self.backend}，模型类别名称：", self.model.names)
+        self._is_tracking = False
+        # 推理线程与界面线程共用同一模型，预测、跟踪和重置需互斥执行
+        self._lock = threading.RLock()
+
+    def _imgsz_kwargs(self, imgsz):
+        """返回推理时的输入尺寸参数，未指定或模型输入尺寸固定时使用模型默认尺寸"""
+        return {"imgsz": imgsz} if imgsz and self.supports_dynamic_imgsz else {}
+
+    def predict(self, source, imgsz=None):
+        """对图片进行预测，确保禁用跟踪
+
+        source 可以是图片路径或 BGR 格式的 numpy 帧；返回 (中文类别名, 置信度, 标注后的 BGR 帧)，
+        标注结果只在内存中生成，是否归档由 ImageArchiver 决定。启用结果缓存时，内容相同的图片直接返回缓存结果；
+        缓存结果按默认输入尺寸计算，指定 imgsz 时不使用缓存。
+        """
+        frame, content_hash = load_source(source)
+        if frame is None:
+            print("未检测到目标")
+            return None, None, None
+
+        kwargs = self._imgsz_kwargs(imgsz)
+        cache = self.cache if not kwargs else None
+        summary = cache.get(content_hash, self.fingerprint) if cache is not None else None
+        if summary is None:
+            with self._lock:
+                self.reset_model()
+                results = self.model.predict(source=frame, conf=0.1, save=False, show=False, stream=False, **kwargs)
+            summary = self._summarize(results[0]) if len(results) > 0 else (None, None, [])
+            if cache is not None:
+                cache.put(content_hash, self.fingerprint, summary)
+
+        chinese_class_name, confidence, boxes = summary
+        if chinese_class_name is not None:
+            print(f"检测到目标：{chinese_class_name}, 置信度：{confidence}")
+            return chinese_class_name, confidence, self._annotate(frame, boxes)
+        print("未检测到目标")
+        return None, None, None
+
+    def predict_batch(self, image_paths, batch_size=BATCH_SIZE, annotate=True):
+        """按批次对多张图片进行预测，逐张产出 (图片路径, 中文类别名, 置信度, 标注后的 BGR 帧)
+
+        每批图片一次性送入网络，命中结果缓存的图片不再参与推理；无法读取或未检测到目标的图片
+        产出 (路径, None, None, None)。annotate 为 False 时不生成标注图，标注帧位置为 None。
+        """
+        batch_size = max(1, batch_size)
+        for start in range(0, len(image_paths), batch_size):
+            chunk = image_paths[start:start + batch_size]
+            loaded = [load_source(path) for path in chunk]
+            summaries = {}
+            if self.cache is not None:
+                for i, (frame, content_hash) in enumerate(loaded):
+                    if frame is not None:
+                        cached = self.cache.get(content_hash, self.fingerprint)
+                        if cached is not None:
+                            summaries[i] = cached
+
+            pending = [i for i, (frame, _) in enumerate(loaded) if frame is not None and i not in summaries]
+            if pending:
+                with self._lock:
+                    self.reset_model()
+                    results = self.model.predict(source=[loaded[i][0] for i in pending], conf=0.1, save=False,
+                                                 show=False, stream=False, verbose=False)
+                for i, result in zip(pending, results):
+                    summaries[i] = self._summarize(result)
+                    if self.cache is not None:
+                        self.cache.put(loaded[i][1], self.fingerprint, summaries[i])
+
+            for i, path in enumerate(chunk):
+                summary = summaries.get(i)
+                if summary is None or summary[0] is None:
+                    yield path, None, None, None
+                    continue
+                chinese_class_name, confidence, boxes = summary
+                annotated = self._annotate(loaded[i][0], boxes) if annotate else None
+                yield path, chinese_class_name, confidence, annotated
+
+    def _summarize(self, result):
+        """提取单张图片的结果，返回 (首个目标的中文类别名, 置信度, 全部检测框)
+
+        检测框为 (x1, y1, x2, y2, 标签文本) 列表，可直接缓存并交给 OverlayRenderer 绘制。
+        """
+        boxes = result.boxes
+        if len(boxes) == 0:
+            return None, None, []
+        xyxy = boxes.xyxy.cpu().numpy().astype(int).tolist()
+        class_ids = boxes.cls.cpu().numpy().astype(int).tolist()
+        confidences = boxes.conf.cpu().numpy().tolist()
+        detections = [(x1, y1, x2, y2, f"{result.names[class_id]} {confidence:.2f}")
+                      for (x1, y1, x2, y2), class_id, confidence in zip(xyxy, class_ids, confidences)]
+        class_name = result.names[class_ids[0]]
+        return self.class_name_map.get(class_name, class_name), float(confidences[0]), detections
+
+    def _annotate(self, frame, boxes):
+        """在帧的副本上绘制检测框"""
+        return self.renderer.draw(frame.copy(), boxes)
+
+    def track(self, frame, imgsz=None):
+        """对视频帧进行跟踪，imgsz 为推理输入尺寸，未指定时使用模型默认尺寸"""
+        with self._lock:
+            return self.model.track(source=frame, conf=0.1, persist=True, stream=False, verbose=False,
+                                    **self._imgsz_kwargs(imgsz))
+
+    def track_batch(self, frames):
+        """对连续的一批视频帧进行跟踪，按顺序返回每一帧的结果
+
+        整批帧一次送入网络；非流式输入的各帧依次经过同一个跟踪器，跟踪ID在批次之间保持连续。
+        """
+        with self._lock:
+            return self.model.track(source=list(frames), conf=0.1, persist=True, stream=False, verbose=False)
+
+    def reset_model(self):
+        """清除跟踪器和预测器的跟踪状态，保留已加载的网络权重"""
+        with self._lock:
+            # 移除 model.track 注册的跟踪回调，使后续 predict 不再经过跟踪器；
+            # 原地修改列表，预测器与模型共享同一份回调字典
+            for event in ("on_predict_start", "on_predict_postprocess_end"):
+                callbacks = getattr(self.model, "callbacks", {}).get(event)
+                if callbacks:
+                    callbacks[:] = [
+                        cb for cb in callbacks
+                        if getattr(getattr(cb, "func", cb), "__module__", "") != "ultralytics.trackers.track"
+                    ]
+
+            # 丢弃 ByteTrack/BoT-SORT 实例及其持久化的跟踪ID，下次 track 时重新创建
+            predictor = getattr(self.model, "predictor", None)
+            if predictor is not None and hasattr(predictor, "trackers"):
+                for tracker in predictor.trackers:
+                    if hasattr(tracker, "reset"):
+                        tracker.reset()
+                del predictor.trackers
+        print("跟踪状态已重置")
+
+
+# 识别结果缓存：按图片内容哈希和模型指纹缓存结果，内存 LRU 之下还有一层 SQLite 持久化
+# 缓存表由 database.MIGRATIONS 创建；读取使用自己的连接，写入交给数据库的写入线程，不在推理线程中提交事务
+class ResultCache:
+    INSERT = ("INSERT OR REPLACE INTO result_cache (HASH, MODEL, RESULT, CONFIDENCE, BOXES, CREATED) "
+              "VALUES (?, ?, ?, ?, ?, datetime('now'))")
+    DELETE_OTHER_MODELS = "DELETE FROM result_cache WHERE MODEL != ?"
+    WRITE_KIND = "result_cache"  # 写入器按此类别单独统计缓存写入，不计入预测记录
+
+    def __init__(self, db_name=RESULT_CACHE_DB, memory_size=256, enabled=RESULT_CACHE_ENABLED, max_pending=4096):
+        """初始化结果缓存，数据库连接在第一次使用时打开"""
+        self.db_name = db_name
+        self.memory_size = memory_size
+        self.enabled = enabled
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writer = None
+        self._pending = []  # 未绑定写入器时暂存的 (语句, 参数列表)，由 take_pending 取走
+        self.max_pending = max_pending
+        self.dropped_writes = 0
+        self._fingerprint = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def attach(self, writer):
+        """把持久化写入交给 writer（database.PredictionWriter），并从它写入的数据库文件读取缓存；writer 为 None 时保持暂存"""
+        if writer is None:
+            return
+        with self._lock:
+            if writer.db_name != self.db_name and self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self.db_name = writer.db_name
+            self._writer = writer
+            pending, self._pending = self._pending, []
+        self.submit_pending(pending)
+
+    def take_pending(self):
+        """取走未绑定写入器时积累的写入，供多进程模式的工作进程交给主进程写库"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        return pending
+
+    def submit_pending(self, pending):
+        """把 take_pending 取出的写入交给写入器"""
+        with self._lock:
+            for statement, rows in pending:
+                self._write(statement, rows)
+
+    def _write(self, statement, rows):
+        """提交一组写入，未绑定写入器时先暂存，暂存数达到 max_pending 后丢弃新的写入（调用方需持有锁）"""
+        if self._writer is not None:
+            self._writer.submit_rows(self.WRITE_KIND, statement, rows)
+        elif len(self._pending) < self.max_pending:
+            self._pending.append((statement, rows))
+        else:
+            # 丢弃的只是缓存结果，下次遇到同一图片重新推理即可；保留最早的写入，切换模型的删除语句不会丢失
+            self.dropped_writes += 1
+
+    def _connect(self):
+        """打开只用于读取的缓存数据库连接（调用方需持有锁）"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        return self._conn
+
+    def _switch_model(self, fingerprint):
+        """模型指纹变化时清空内存缓存并删除旧模型的持久化结果（调用方需持有锁）"""
+        if fingerprint == self._fingerprint:
+            return
+        self._memory.clear()
+        self._write(self.DELETE_OTHER_MODELS, [(fingerprint,)])
+        self._fingerprint = fingerprint
+
+    def get(self, content_hash, fingerprint):
+        """查询缓存，返回 (中文类别名, 置信度, 检测框列表)，未命中返回 None"""
+        if not self.enabled or content_hash is None:
+            return None
+        with self._lock:
+            self._switch_model(fingerprint)
+            summary = self._memory.get(content_hash)
+            if summary is not None:
+                self._memory.move_to_end(content_hash)
+                self.memory_hits += 1
+                return summary
+            try:
+                row = self._connect().execute(
+                    "SELECT RESULT, CONFIDENCE, BOXES FROM result_cache WHERE HASH = ? AND MODEL = ?",
+                    (content_hash, fingerprint)).fetchone()
+            except sqlite3.Error as e:
+                print("查询结果缓存失败：", e)
+                return None
+            if row is None:
+                self.misses += 1
+                return None
+            summary = (row[0], row[1], [tuple(box) for box in json.loads(row[2])])
+            self._remember(content_hash, summary)
+            self.disk_hits += 1
+            return summary
+
+    def put(self, content_hash, fingerprint, summary):
+        """写入缓存，持久化写入排队交给写入线程，立即返回"""
+        if not self.enabled or content_hash is None:
+            return
+        result, confidence, boxes = summary
+        with self._lock:
+            self._switch_model(fingerprint)
+            self._write(self.INSERT, [(content_hash, fingerprint, result, confidence,
+                                       json.dumps(boxes, ensure_ascii=False))])
+            self._remember(content_hash, summary)
+
+    def _remember(self, content_hash, summary):
+        """放入内存 LRU（调用方需持有锁）"""
+        self._memory[content_hash] = summary
+        self._memory.move_to_end(content_hash)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        """返回命中和未命中次数"""
+        return {"memory_hits": self.memory_hits, "disk_hits": self.disk_hits, "misses": self.misses}
+
+
+result_cache = ResultCache()
+
+
+# 标注结果归档：在后台线程中按配置的格式和质量写盘，并限制保留的文件数量
+class ImageArchiver:
+    def __init__(self, enabled=ARCHIVE_ENABLED, archive_dir=ARCHIVE_DIR, image_format=ARCHIVE_FORMAT,
+                 quality=ARCHIVE_QUALITY, max_files=ARCHIVE_MAX_FILES, queue_size=64):
+        """初始化归档器，写盘线程在第一次提交时启动"""
+        self.enabled = enabled
+        self.archive_dir = archive_dir
+        self.image_format = image_format.lower().lstrip(".")
+        self.quality = max(0, min(100, quality))
+        self.max_files = max_files
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._files = None  # 已归档文件，按写入先后排列
+        self.written = 0
+        self.dropped = 0
+
+    def _encode_params(self):
+        """根据格式返回 cv2.imencode 的质量参数"""
+        if self.image_format in ("jpg", "jpeg"):
+            return [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        if self.image_format == "webp":
+            return [cv2.IMWRITE_WEBP_QUALITY, max(1, self.quality)]
+        if self.image_format == "png":
+            return [cv2.IMWRITE_PNG_COMPRESSION, round(9 - self.quality * 9 / 100)]
+        return []
+
+    def submit(self, frame, name):
+        """提交一张标注图片，未启用归档或队列已满时直接返回"""
+        if not self.enabled or frame is None:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ImageArchiver", daemon=True)
+            self._thread.start()
+        try:
+            # 复制一份，调用方可以继续修改原帧
+            self._queue.put_nowait((frame.copy(), name))
+        except queue.Full:
+            self.dropped += 1
+            print("归档队列已满，丢弃图片：", name)
+
+    def close(self):
+        """等待队列中的图片写完后停止写盘线程"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _is_archive(self, file_name):
+        """判断文件是否由归档器写入，只有这些文件参与数量限制，目录中的其他文件不会被删除"""
+        pattern = rf"\d{{8}}_\d{{6}}_[0-9a-f]{{8}}_.+\.{re.escape(self.image_format)}"
+        return re.fullmatch(pattern, file_name) is not None
+
+    def _run(self):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        if self._files is None:
+            existing = [os.path.join(self.archive_dir, f) for f in os.listdir(self.archive_dir) if self._is_archive(f)]
+            self._files = deque(sorted((f for f in existing if os.path.isfile(f)), key=os.path.getmtime))
+
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            frame, name = item
+            base_name = os.path.splitext(os.path.basename(name))[0] or "image"
+            file_name = f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}_{base_name}.{self.image_format}"
+            path = os.path.join(self.archive_dir, file_name)
+            try:
+                ok, buffer = cv2.imencode(f".{self.image_format}", frame, self._encode_params())
+                if not ok:
+                    raise ValueError("图片编码失败")
+                # 使用 tofile 写盘，兼容包含中文的路径
+                buffer.tofile(path)
+                self._files.append(path)
+                self.written += 1
+            except (OSError, ValueError, cv2.error) as e:
+                print("归档图片失败：", e)
+                continue
+
+            while self.max_files and len(self._files) > self.max_files:
+                try:
+                    os.remove(self._files.popleft())
+                except OSError:
+                    pass
+
+
+image_archiver = ImageArchiver()
+
+
+# 检测结果叠加绘制：字体只加载一次，标签按文本缓存为透明度掩码，直接在 BGR 帧上绘制
+class OverlayRenderer:
+    def __init__(self, font_path="SimHei.ttf", font_size=24, color=(0, 255, 0), cache_size=512):
+        """加载字体并初始化标签缓存"""
+        try:
+            self.font = ImageFont.truetype(font_path, font_size)
+        except OSError:
+            self.font = ImageFont.load_default()
+        self.color = np.array(color, dtype=np.uint16)  # BGR
+        self.cache_size = cache_size
+        self._label_cache = OrderedDict()
+        # 同一个渲染器可能被多个线程同时使用，标签缓存的读写需要加锁；绘制的帧各不相同，不必加锁
+        self._lock = threading.Lock()
+
+    def _label_mask(self, text):
+        """返回文本的透明度掩码 (高, 宽, 1)，取值 0~255，以及文本的前进宽度"""
+        with self._lock:
+            cached = self._label_cache.get(text)
+            if cached is not None:
+                self._label_cache.move_to_end(text)
+                return cached
+
+            left, top, right, bottom = self.font.getbbox(text)
+            image = Image.new("L", (max(right, 1), max(bottom, 1)), 0)
+            ImageDraw.Draw(image).text((0, 0), text, font=self.font, fill=255)
+            cached = (np.asarray(image, dtype=np.uint16)[:, :, None], self.font.getlength(text))
+            self._label_cache[text] = cached
+            if len(self._label_cache) > self.cache_size:
+                self._label_cache.popitem(last=False)
+            return cached
+
+    def _label_parts(self, text):
+        """把标签拆成类别名和最后一个空格后的置信度两段分别缓存，返回 [(掩码, 横向偏移)]
+
+        置信度每帧都在变化，整段缓存几乎总是未命中；分开后类别名只栅格化一次，置信度最多 101 种取值。
+        """
+        prefix, separator, suffix = text.rpartition(" ")
+        if not separator:
+            return [(self._label_mask(text)[0], 0)]
+        prefix_mask, prefix_width = self._label_mask(prefix)
+        suffix_mask, _ = self._label_mask(suffix)
+        return [(prefix_mask, 0), (suffix_mask, int(round(prefix_width + self._label_mask(" ")[1])))]
+
+    def draw(self, frame, detections):
+        """在 BGR 帧上原地绘制所有检测框和标签，detections 为 (x1, y1, x2, y2, 标签文本) 列表"""
+        frame_height, frame_width = frame.shape[:2]
+        color = tuple(int(c) for c in self.color)
+        for x1, y1, x2, y2, text in detections:
+            cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), color, 2)
+
+            # 标签位于框左上角上方 30 像素处，超出画面的部分裁掉
+            for mask, offset in self._label_parts(text):
+                top, left = int(y1) - 30, int(x1) + offset
+                y_start, x_start = max(top, 0), max(left, 0)
+                y_end = min(top + mask.shape[0], frame_height)
+                x_end = min(left + mask.shape[1], frame_width)
+                if y_start >= y_end or x_start >= x_end:
+                    continue
+                alpha = mask[y_start - top:y_end - top, x_start - left:x_end - left]
+                roi = frame[y_start:y_end, x_start:x_end]
+                roi[:] = ((roi * (255 - alpha) + self.color * alpha) // 255).astype(np.uint8)
+        return frame
+
+
+# 整段视频的离线检测结果：按列存放所有帧的检测框，frame_offsets[i]:frame_offsets[i + 1] 为第 i 帧的检测
+class VideoDetections:
+    def __init__(self, frame_offsets, boxes, track_ids, class_ids, confidences, names, class_name_map=None):
+        """初始化检测结果，track_ids 中 -1 表示没有跟踪ID"""
+        self.frame_offsets = frame_offsets
+        self.boxes = boxes
+        self.track_ids = track_ids
+        self.class_ids = class_ids
+        self.confidences = confidences
+        self.names = list(names)
+        self.class_name_map = class_name_map or {}
+
+    @property
+    def frame_count(self):
+        return len(self.frame_offsets) - 1
+
+    @staticmethod
+    def path_for(video_hash, fingerprint):
+        """结果文件以视频哈希和模型指纹命名，换视频或换模型都不会误用旧结果"""
+        return os.path.join(ANALYSIS_DIR, f"{video_hash}_{fingerprint}.npz")
+
+    @classmethod
+    def load(cls, path, class_name_map=None):
+        """读取结果文件，不存在或已损坏时返回 None"""
+        try:
+            with np.load(path) as data:
+                return cls(data["frame_offsets"], data["boxes"], data["track_ids"], data["class_ids"],
+                           data["confidences"], json.loads(str(data["names"])), class_name_map)
+        except (OSError, KeyError, ValueError) as e:
+            if os.path.exists(path):
+                print("读取视频分析结果失败：", e)
+            return None
+
+    def save(self, path):
+        """先写临时文件再替换，中途退出不会留下不完整的结果文件"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = path + ".tmp.npz"
+        np.savez_compressed(temp_path, frame_offsets=self.frame_offsets, boxes=self.boxes,
+                            track_ids=self.track_ids, class_ids=self.class_ids, confidences=self.confidences,
+                            names=np.array(json.dumps(self.names, ensure_ascii=False)))
+        os.replace(temp_path, path)
+
+    def frame(self, frame_index):
+        """返回指定帧的 (检测框列表, 跟踪ID列表, 结果文本)，与实时跟踪的输出格式相同"""
+        if not 0 <= frame_index < self.frame_count:
+            return [], [], "未检测到目标"
+        start, end = self.frame_offsets[frame_index], self.frame_offsets[frame_index + 1]
+        if start == end:
+            return [], [], "未检测到目标"
+        detections = []
+        detected_objects = []
+        for (x1, y1, x2, y2), class_id, confidence in zip(
+                self.boxes[start:end], self.class_ids[start:end], self.confidences[start:end]):
+            class_name = self.names[class_id]
+            detections.append((x1, y1, x2, y2, f"{class_name} {confidence:.2f}"))
+            detected_objects.append(f"{self.class_name_map.get(class_name, class_name)} ({confidence:.2f})")
+        track_ids = [None if t < 0 else int(t) for t in self.track_ids[start:end]]
+        return detections, track_ids, "检测到: " + ", ".join(detected_objects)
+
+
+def find_video_detections(video_path, model):
+    """查找该视频在当前模型下已保存的离线分析结果，没有则返回 None"""
+    path = VideoDetections.path_for(video_fingerprint(video_path), model.fingerprint)
+    return VideoDetections.load(path, model.class_name_map) if os.path.exists(path) else None
+
+
+def analyze_video(model, video_path, batch_size=ANALYSIS_BATCH_SIZE, progress=None, should_stop=None):
+    """不按播放节奏、逐批跟踪整段视频并保存结果，返回 VideoDetections
+
+    progress(已处理帧数, 总帧数) 在每批结束后调用；should_stop() 返回 True 时放弃分析并返回 None。
+    """
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise ValueError(f"无法打开视频文件：{video_path}")
+    total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    counts, boxes, track_ids, class_ids, confidences = [], [], [], [], []
+    model.reset_model()
+    try:
+        while True:
+            frames = []
+            for _ in range(max(1, batch_size)):
+                ret, frame = capture.read()
+                if not ret:
+                    break
+                frames.append(frame)
+            if not frames:
+                break
+            for result in model.track_batch(frames):
+                result_boxes = result.boxes
+                counts.append(len(result_boxes))
+                if len(result_boxes) == 0:
+                    continue
+                boxes.append(result_boxes.xyxy.cpu().numpy())
+                class_ids.append(result_boxes.cls.cpu().numpy())
+                confidences.append(result_boxes.conf.cpu().numpy())
+                if result_boxes.id is not None:
+                    track_ids.append(result_boxes.id.cpu().numpy())
+                else:
+                    track_ids.append(np.full(len(result_boxes), -1))
+            if progress is not None:
+                progress(len(counts), max(total, len(counts)))
+            if should_stop is not None and should_stop():
+                return None
+    finally:
+        capture.release()
+        model.reset_model()
+
+    names = model.model.names
+    detections = VideoDetections(
+        frame_offsets=np.concatenate(([0], np.cumsum(counts))).astype(np.int64),
+        boxes=np.concatenate(boxes).astype(np.int32) if boxes else np.zeros((0, 4), dtype=np.int32),
+        track_ids=np.concatenate(track_ids).astype(np.int32) if track_ids else np.zeros(0, dtype=np.int32),
+        class_ids=np.concatenate(class_ids).astype(np.int16) if class_ids else np.zeros(0, dtype=np.int16),
+        confidences=(np.concatenate(confidences).astype(np.float32) if confidences
+                     else np.zeros(0, dtype=np.float32)),
+        names=[names[i] for i in range(len(names))],
+        class_name_map=model.class_name_map,
+    )
+    detections.save(VideoDetections.path_for(video_fingerprint(video_path), model.fingerprint))
+    return detections